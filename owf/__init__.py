@@ -0,0 +1 @@
+"""Utilidades de datos del Visualizador Comparativo OWF (independientes de Streamlit)."""
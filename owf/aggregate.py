@@ -0,0 +1,215 @@
+"""Motor de agregación de escenarios en una sola pasada.
+
+``aggregate_scenario`` recorre una única vez las columnas de oferta y demanda de
+un escenario (sin modificar ni copiar el DataFrame de origen) y produce todos
+los resultados que necesitan los gráficos: totales anuales, totales diarios
+para las cajas mensuales, cuantiles mensuales, composición de la demanda y
+series por subcuenca. Los grupos de columnas se precalculan una vez por
+esquema de columnas.
+"""
+import functools
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from owf.schema import DEMAND_COMPONENTS, DEMANDA_AGUA_COLS, OFERTA_AGUA_COLS, SUBBASINS
+
+MONTHS = ['Ene', 'Feb', 'Mar', 'Abr', 'May', 'Jun', 'Jul', 'Ago', 'Sep', 'Oct', 'Nov', 'Dic']
+QUANTILES = np.array([0.0, 0.25, 0.5, 0.75, 1.0])
+KINDS = ['supply', 'demand']
+COMPONENTS = list(DEMAND_COMPONENTS)
+# La composición que se grafica excluye el componente ambiental.
+COMPOSITION_COMPONENTS = [name for name in COMPONENTS if name != 'Ambiental']
+
+BoxStats = namedtuple("BoxStats", [
+    "stats",     # pd.DataFrame: Month, lowerfence, q1, median, q3, upperfence
+    "outliers",  # pd.DataFrame: Month, Total (puntos fuera de los bigotes)
+    "whiskers",  # 'tukey' (1.5 x IQR, con valores atípicos) o 'minmax' (mínimo y máximo, sin atípicos)
+], defaults=['tukey'])
+
+ColumnGroups = namedtuple("ColumnGroups", ["supply", "demand", "complete_components"])
+
+ScenarioAggregates = namedtuple("ScenarioAggregates", [
+    "annual_supply",            # pd.Series: total anual de oferta (índice: fin de año)
+    "annual_demand",            # pd.Series: total anual de demanda
+    "daily_supply",             # pd.Series: total diario de oferta (índice: fecha)
+    "daily_demand",             # pd.Series: total diario de demanda
+    "monthly_quantiles",        # np.ndarray (oferta/demanda, mes, cuantil)
+    "box_supply",               # BoxStats mensual de la oferta diaria
+    "box_demand",               # BoxStats mensual de la demanda diaria
+    "composition",              # pd.DataFrame: Componente, Porcentaje
+    "subbasin_supply",          # pd.DataFrame (fecha x subcuenca)
+    "subbasin_demand",          # pd.DataFrame (fecha x subcuenca)
+    "subbasin_annual_supply",   # pd.DataFrame (fin de año x subcuenca)
+    "subbasin_annual_demand",   # pd.DataFrame (fin de año x subcuenca)
+])
+
+
+@functools.lru_cache(maxsize=16)
+def column_groups(columns):
+    """Precalcula a qué subcuenca y componente pertenece cada columna presente en ``columns``."""
+    present = set(columns)
+    subbasin_pos = {name: i for i, name in enumerate(SUBBASINS)}
+    supply = tuple((col, i) for i, col in enumerate(OFERTA_AGUA_COLS) if col in present)
+    component_of = {col: k for k, name in enumerate(COMPONENTS) for col in DEMAND_COMPONENTS[name]}
+    demand = tuple(
+        (col, component_of[col], subbasin_pos[col[len('Denv_'):-len('_cmd')]])
+        for col in DEMANDA_AGUA_COLS if col in present
+    )
+    complete = np.array([all(col in present for col in DEMAND_COMPONENTS[name]) for name in COMPONENTS])
+    return ColumnGroups(supply, demand, complete)
+
+
+def _accumulate(out, values):
+    """Suma ``values`` sobre ``out`` ignorando NaN, como ``DataFrame.sum``."""
+    np.add(out, values, out=out, where=~np.isnan(values))
+
+
+def daily_totals(df):
+    """Totales diarios de oferta y demanda (tiempo x ``KINDS``), sumando solo esas columnas.
+
+    Es lo único que necesita el ensamble de cada réplica; evita el resto de
+    agregados de ``aggregate_scenario``.
+    """
+    groups = column_groups(tuple(df.columns))
+    totals = np.zeros((len(df), len(KINDS)))
+    for col, _ in groups.supply:
+        _accumulate(totals[:, 0], df[col].to_numpy())
+    for col, _, _ in groups.demand:
+        _accumulate(totals[:, 1], df[col].to_numpy())
+    return pd.DataFrame(totals, index=pd.DatetimeIndex(df.index), columns=KINDS)
+
+
+def year_end_index(years):
+    """Índice de fechas de fin de año, como el que produce ``resample('A')``."""
+    return pd.to_datetime([f"{year}-12-31" for year in years])
+
+
+def group_sum(values, group_idx, n_groups):
+    """Suma las filas de ``values`` por grupo (``group_idx`` en ``0..n_groups-1``, todos presentes)."""
+    if np.any(np.diff(group_idx) < 0):
+        order = np.argsort(group_idx, kind='stable')
+        values, group_idx = values[order], group_idx[order]
+    if n_groups == 0:
+        return np.zeros((0,) + values.shape[1:])
+    starts = np.searchsorted(group_idx, np.arange(n_groups))
+    return np.add.reduceat(values, starts, axis=0)
+
+
+def group_quantiles(values, group_idx, n_groups, quantiles=QUANTILES):
+    """Cuantiles (interpolación lineal) de ``values`` por grupo, sin bucles por grupo.
+
+    Devuelve un arreglo (grupo, cuantil); los grupos vacíos quedan en NaN.
+    """
+    if len(values) == 0:
+        return np.full((n_groups, len(quantiles)), np.nan)
+    order = np.lexsort((values, group_idx))
+    sorted_values = values[order]
+    counts = np.bincount(group_idx, minlength=n_groups)
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+
+    positions = quantiles[None, :] * np.maximum(counts - 1, 0)[:, None]
+    lower = np.floor(positions).astype(int)
+    upper = np.ceil(positions).astype(int)
+    fraction = positions - lower
+    lo_values = sorted_values[np.minimum(starts[:, None] + lower, len(values) - 1)]
+    hi_values = sorted_values[np.minimum(starts[:, None] + upper, len(values) - 1)]
+    result = lo_values + (hi_values - lo_values) * fraction
+    result[counts == 0] = np.nan
+    return result
+
+
+def group_box_stats(values, group_idx, n_groups, whisker=1.5):
+    """Estadísticos de caja por grupo: cuartiles, bigotes de Tukey y máscara de valores atípicos.
+
+    Reproduce lo que Plotly calcularía en el navegador (cuartiles lineales y
+    bigotes hasta el dato más extremo dentro de ``whisker`` x IQR).
+    """
+    q1, median, q3 = group_quantiles(values, group_idx, n_groups, np.array([0.25, 0.5, 0.75])).T
+    iqr = q3 - q1
+    low, high = q1 - whisker * iqr, q3 + whisker * iqr
+    inside = (values >= low[group_idx]) & (values <= high[group_idx])
+
+    lowerfence = np.full(n_groups, np.inf)
+    upperfence = np.full(n_groups, -np.inf)
+    np.minimum.at(lowerfence, group_idx[inside], values[inside])
+    np.maximum.at(upperfence, group_idx[inside], values[inside])
+    empty = np.bincount(group_idx, minlength=n_groups) == 0
+    lowerfence[empty] = upperfence[empty] = np.nan
+    return np.column_stack([lowerfence, q1, median, q3, upperfence]), ~inside
+
+
+def monthly_box_stats(daily_totals):
+    """Calcula en el servidor las cajas mensuales de una serie diaria (solo se envían los estadísticos)."""
+    values = np.asarray(daily_totals, dtype=float)
+    month_idx = daily_totals.index.month.to_numpy() - 1
+    stats, outliers = group_box_stats(values, month_idx, len(MONTHS))
+    return BoxStats(
+        stats=monthly_stats_frame(stats),
+        outliers=pd.DataFrame({'Month': np.array(MONTHS)[month_idx[outliers]], 'Total': values[outliers]}),
+    )
+
+
+def aggregate_scenario(df):
+    """Calcula todos los agregados de un escenario en una sola pasada por sus columnas."""
+    groups = column_groups(tuple(df.columns))
+    dates = pd.DatetimeIndex(df.index)
+    n_rows, n_sub, n_comp = len(df), len(SUBBASINS), len(COMPONENTS)
+
+    # Matriz de salida (tiempo x grupo): [oferta por subcuenca | demanda por subcuenca | componentes]
+    block = np.zeros((n_rows, 2 * n_sub + n_comp))
+    sub_supply = block[:, :n_sub]
+    sub_demand = block[:, n_sub:2 * n_sub]
+    components = block[:, 2 * n_sub:]
+    for col, j in groups.supply:
+        _accumulate(sub_supply[:, j], df[col].to_numpy())
+    for col, k, j in groups.demand:
+        values = df[col].to_numpy()
+        _accumulate(sub_demand[:, j], values)
+        _accumulate(components[:, k], values)
+
+    supply = sub_supply.sum(axis=1)
+    demand = components.sum(axis=1)
+
+    years, year_idx = np.unique(dates.year.to_numpy(), return_inverse=True)
+    annual = group_sum(np.column_stack([supply, demand, block]), year_idx, len(years))
+    year_index = year_end_index(years)
+
+    month_idx = dates.month.to_numpy() - 1
+    monthly = np.stack([group_quantiles(totals, month_idx, len(MONTHS)) for totals in (supply, demand)])
+
+    component_totals = components.sum(axis=0)
+    composition_mask = groups.complete_components & np.isin(COMPONENTS, COMPOSITION_COMPONENTS)
+    total_demand = component_totals[composition_mask].sum()
+    if composition_mask.any() and total_demand != 0:
+        composition = pd.DataFrame({
+            'Componente': np.array(COMPONENTS)[composition_mask],
+            'Porcentaje': component_totals[composition_mask] / total_demand * 100,
+        })
+    else:
+        composition = pd.DataFrame()
+
+    daily_supply = pd.Series(supply, index=dates, name='Total')
+    daily_demand = pd.Series(demand, index=dates, name='Total')
+    return ScenarioAggregates(
+        annual_supply=pd.Series(annual[:, 0], index=year_index, name='Total'),
+        annual_demand=pd.Series(annual[:, 1], index=year_index, name='Total'),
+        daily_supply=daily_supply,
+        daily_demand=daily_demand,
+        monthly_quantiles=monthly,
+        box_supply=monthly_box_stats(daily_supply),
+        box_demand=monthly_box_stats(daily_demand),
+        composition=composition,
+        subbasin_supply=pd.DataFrame(sub_supply, index=dates, columns=SUBBASINS, copy=False),
+        subbasin_demand=pd.DataFrame(sub_demand, index=dates, columns=SUBBASINS, copy=False),
+        subbasin_annual_supply=pd.DataFrame(annual[:, 2:2 + n_sub], index=year_index, columns=SUBBASINS),
+        subbasin_annual_demand=pd.DataFrame(annual[:, 2 + n_sub:2 + 2 * n_sub], index=year_index, columns=SUBBASINS),
+    )
+
+
+def monthly_stats_frame(quantiles):
+    """Convierte estadísticos mensuales (mes x [bigote inferior, Q1, mediana, Q3, bigote superior]) en un DataFrame."""
+    stats = pd.DataFrame(np.asarray(quantiles, dtype=float), columns=['lowerfence', 'q1', 'median', 'q3', 'upperfence'])
+    stats.insert(0, 'Month', MONTHS)
+    return stats.dropna()
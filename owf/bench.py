@@ -0,0 +1,390 @@
+"""Mediciones de rendimiento sin acceder a Google Drive.
+
+Incluye un generador de escenarios sintéticos con el esquema real (``Date`` y
+todas las columnas de ``OFERTA_AGUA_COLS`` y ``DEMANDA_AGUA_COLS``, con la
+longitud que se pida) y ``DriveStandIn``, un servidor HTTP local que imita el
+punto ``docs.google.com/uc?export=download&id=``. Las mediciones cubren las
+etapas de la aplicación con 1, 2 y N escenarios:
+
+- ``load``: descarga y análisis desde el servidor local (en otro proceso), sin cachés ni almacén;
+- ``store``: lectura desde el almacén local de bloques;
+- ``parse``: análisis del CSV ya descargado;
+- ``aggregate``: agregación y métricas por escenario;
+- ``figures``: construcción de todas las figuras de la comparación.
+
+Cada medición guarda el mínimo y la mediana de varias repeticiones. Con
+``--baseline`` se comparan contra una línea base guardada (``--save-baseline``)
+y se informa como regresión todo lo que sea más lento que la tolerancia.
+
+Uso::
+
+    python -m owf.bench run --scenarios 8 --repeat 5 --save-baseline
+    python -m owf.bench run --scenarios 8 --repeat 5 --baseline soporte/bench_baseline.json
+    python -m owf.bench generate --output-dir sinteticos --count 4
+    python -m owf.bench serve --port 8766   # OWF_DRIVE_URL=http://127.0.0.1:8766/uc?export=download&id={file_id}
+"""
+import argparse
+import contextlib
+import functools
+import http.server
+import io
+import itertools
+import json
+import multiprocessing
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import zlib
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+import pandas as pd
+
+from owf.aggregate import aggregate_scenario
+from owf.compare import aggregates_metrics, comparison_from_metrics, comparison_sections
+from owf.fetch import fetch_scenarios, parse_scenario_csv
+from owf.schema import DEMANDA_AGUA_COLS, HORIZON_YEARS, OFERTA_AGUA_COLS, iter_grid, scenario_file_name
+from owf.store import read_scenario, write_scenario
+
+BASELINE_PATH = os.path.join("soporte", "bench_baseline.json")
+BENCHMARKS = ['load', 'store', 'parse', 'aggregate', 'figures']
+# Días de la serie diaria simulada completa (2022-2050).
+FULL_DAYS = len(pd.date_range(f"{HORIZON_YEARS[0]}-01-01", f"{HORIZON_YEARS[-1]}-12-31", freq="D"))
+DEFAULT_TOLERANCE = 0.25
+
+
+# --- Escenarios sintéticos ---
+
+def _seed(name):
+    return zlib.crc32(str(name).encode("utf-8"))
+
+
+def synthetic_frame(n_days=FULL_DAYS, seed=0, start=f"{HORIZON_YEARS[0]}-01-01"):
+    """Escenario sintético con el esquema de los CSV: oferta estacional y demandas que a veces la superan."""
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range(start, periods=n_days, freq="D", name="Date")
+    season = 1 + 0.6 * np.sin(2 * np.pi * dates.dayofyear.to_numpy() / 365.25)
+    n_basins = len(OFERTA_AGUA_COLS)
+    scale = rng.lognormal(12, 1, n_basins)
+    supply = scale * season[:, None] * rng.lognormal(0, 0.3, (n_days, n_basins))
+    # Cinco componentes de demanda por subcuenca (en el orden de DEMANDA_AGUA_COLS).
+    n_components = len(DEMANDA_AGUA_COLS) // n_basins
+    shares = rng.uniform(0.02, 0.12, n_components * n_basins)
+    demand = np.tile(scale, n_components) * shares * rng.lognormal(0, 0.2, (n_days, len(DEMANDA_AGUA_COLS)))
+    values = np.hstack([supply, demand]).astype("float32")
+    return pd.DataFrame(values, index=dates, columns=OFERTA_AGUA_COLS + DEMANDA_AGUA_COLS)
+
+
+def synthetic_csv(n_days=FULL_DAYS, seed=0):
+    """Contenido CSV (bytes) de un escenario sintético, con la columna de fechas ``Date`` al inicio."""
+    buffer = io.StringIO()
+    synthetic_frame(n_days, seed).to_csv(buffer, float_format="%.6g")
+    return buffer.getvalue().encode("utf-8")
+
+
+def synthetic_scenarios(count, n_days=FULL_DAYS):
+    """``{nombre de archivo: contenido CSV}`` para los primeros ``count`` escenarios de la malla."""
+    names = [scenario_file_name(params) for _, params in itertools.islice(iter_grid(), count)]
+    return {name: synthetic_csv(n_days, _seed(name)) for name in names}
+
+
+def write_synthetic(output_dir, count, n_days=FULL_DAYS):
+    """Escribe los CSV sintéticos y un ``manifest.json`` que usa el nombre de cada archivo como ID."""
+    os.makedirs(output_dir, exist_ok=True)
+    files = synthetic_scenarios(count, n_days)
+    for name, data in files.items():
+        with open(os.path.join(output_dir, name), "wb") as f:
+            f.write(data)
+    with open(os.path.join(output_dir, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump({name: name for name in files}, f, indent=2)
+    return list(files)
+
+
+# --- Servidor local que imita a Google Drive ---
+
+class DriveStandIn:
+    """Servidor HTTP local que responde ``/uc?export=download&id=<id>`` como Google Drive.
+
+    Con ``files = {id: bytes}`` sirve esos archivos (y 404 para otros IDs). Sin
+    ``files`` genera un escenario sintético por ID, siempre el mismo para el
+    mismo ID, de modo que sirve para usar la aplicación con el manifiesto real.
+    ``latency`` añade una espera por petición, en segundos.
+    """
+
+    def __init__(self, files=None, host="127.0.0.1", port=0, latency=0.0, n_days=FULL_DAYS):
+        self.files = files
+        self.latency = latency
+        self.n_days = n_days
+        self._server = http.server.ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url_template(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/uc?export=download&id={{file_id}}"
+
+    def content(self, file_id):
+        """Contenido servido para ``file_id``, o ``None`` si no existe."""
+        if self.files is not None:
+            return self.files.get(file_id)
+        return _generated_csv(file_id, self.n_days)
+
+    def _handler(self):
+        stand_in = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = urlparse(self.path)
+                query = parse_qs(url.query)
+                if stand_in.latency:
+                    time.sleep(stand_in.latency)
+                data = None
+                if url.path == "/uc" and query.get("export") == ["download"] and query.get("id"):
+                    data = stand_in.content(query["id"][0])
+                if data is None:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "text/csv")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name="owf-drive", daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        """Atiende peticiones en el hilo actual hasta interrumpirlo."""
+        try:
+            self._server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self._server.server_close()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def _serve_child(conn, files, latency, n_days):
+    server = DriveStandIn(files, latency=latency, n_days=n_days)
+    conn.send(server.url_template)
+    conn.close()
+    server.serve_forever()
+
+
+@contextlib.contextmanager
+def drive_subprocess(files=None, latency=0.0, n_days=FULL_DAYS):
+    """Ejecuta un ``DriveStandIn`` en otro proceso y devuelve su ``url_template``.
+
+    Así el servidor no comparte CPU ni GIL con el proceso que se mide.
+    """
+    parent, child = multiprocessing.Pipe(duplex=False)
+    process = multiprocessing.Process(target=_serve_child, args=(child, files, latency, n_days),
+                                      name="owf-drive", daemon=True)
+    process.start()
+    child.close()
+    try:
+        if not parent.poll(30):
+            raise RuntimeError("El servidor local no arrancó.")
+        yield parent.recv()
+    finally:
+        parent.close()
+        process.terminate()
+        process.join()
+
+
+# Pocas entradas: cada CSV completo ocupa unos 13 MB y regenerarlo da el mismo resultado.
+@functools.lru_cache(maxsize=4)
+def _generated_csv(file_id, n_days):
+    return synthetic_csv(n_days, _seed(file_id))
+
+
+# --- Mediciones ---
+
+def measure(func, repeat=5, warmup=1):
+    """Ejecuta ``func`` y devuelve ``{'min_ms', 'median_ms', 'repeat'}`` de las repeticiones."""
+    for _ in range(warmup):
+        func()
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append((time.perf_counter() - start) * 1000)
+    return {'min_ms': round(min(times), 3), 'median_ms': round(statistics.median(times), 3), 'repeat': repeat}
+
+
+def _pairs(names):
+    # Con un escenario se compara consigo mismo; con N, el primero frente a cada uno de los demás.
+    return [(names[0], name) for name in names[1:]] or [(names[0], names[0])]
+
+
+def run_benchmarks(counts=(1, 2, 8), n_days=FULL_DAYS, repeat=5, latency=0.0, only=None, progress=None):
+    """Mide cada etapa con cada número de escenarios. Devuelve ``{'meta', 'results'}``."""
+    only = only or BENCHMARKS
+    files = synthetic_scenarios(max(counts), n_days)
+    names = list(files)
+    results = {}
+
+    def record(name, func):
+        results[name] = measure(func, repeat)
+        if progress:
+            progress(name, results[name])
+
+    # El servidor corre en otro proceso para que ``load`` mida solo el lado cliente.
+    serving = drive_subprocess(files, latency=latency) if 'load' in only else contextlib.nullcontext()
+    with serving as url_template, tempfile.TemporaryDirectory(prefix="owf-bench-") as store_dir:
+        frames = {name: parse_scenario_csv(data) for name, data in files.items()}
+        for name, df in frames.items():
+            write_scenario(name, df, store_dir=store_dir, max_bytes=float("inf"))
+        metrics = {name: aggregates_metrics(aggregate_scenario(df)) for name, df in frames.items()}
+
+        for n in counts:
+            subset = names[:n]
+            if 'load' in only:
+                record(f"load[{n}]", lambda: fetch_scenarios(
+                    [(name, name) for name in subset], use_store=False, use_cache=False,
+                    url_template=url_template, retries=0))
+            if 'store' in only:
+                record(f"store[{n}]", lambda: [read_scenario(name, store_dir=store_dir) for name in subset])
+            if 'parse' in only:
+                record(f"parse[{n}]", lambda: [parse_scenario_csv(files[name]) for name in subset])
+            if 'aggregate' in only:
+                record(f"aggregate[{n}]", lambda: [aggregates_metrics(aggregate_scenario(frames[name])) for name in subset])
+            if 'figures' in only:
+                # Sin clave de comparación las figuras no se memorizan: se construyen en cada repetición.
+                record(f"figures[{n}]", lambda: [comparison_sections(comparison_from_metrics(metrics[a], metrics[b]))
+                                                 for a, b in _pairs(subset)])
+
+    meta = {
+        'days': n_days,
+        'counts': list(counts),
+        'repeat': repeat,
+        'latency': latency,
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'machine': platform.machine(),
+    }
+    return {'meta': meta, 'results': results}
+
+
+def compare_to_baseline(current, baseline, tolerance=DEFAULT_TOLERANCE):
+    """Tabla con el tiempo mínimo actual frente a la línea base y si es una regresión."""
+    rows = []
+    for name, result in current['results'].items():
+        base = baseline['results'].get(name)
+        ratio = result['min_ms'] / base['min_ms'] if base and base['min_ms'] > 0 else np.nan
+        rows.append({
+            'Medición': name,
+            'Base (ms)': base['min_ms'] if base else np.nan,
+            'Actual (ms)': result['min_ms'],
+            'Razón': ratio,
+            'Regresión': bool(ratio > 1 + tolerance),
+        })
+    return pd.DataFrame(rows)
+
+
+def _print_results(results):
+    table = pd.DataFrame.from_dict(results, orient="index")
+    print(table.to_string(float_format=lambda value: f"{value:.1f}"))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Mide el rendimiento de las etapas de OWF con escenarios sintéticos.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="Ejecuta las mediciones.")
+    run.add_argument("--scenarios", type=int, default=8, help="N: número de escenarios del caso grande (además de 1 y 2).")
+    run.add_argument("--days", type=int, default=FULL_DAYS, help="Días de cada escenario sintético.")
+    run.add_argument("--repeat", type=int, default=5)
+    run.add_argument("--latency", type=float, default=0.0, help="Espera por petición del servidor local, en segundos.")
+    run.add_argument("--only", nargs="+", choices=BENCHMARKS, default=None)
+    run.add_argument("--output", help="Guarda los resultados en este JSON.")
+    run.add_argument("--baseline", help="Compara contra esta línea base.")
+    run.add_argument("--save-baseline", nargs="?", const=BASELINE_PATH, metavar="RUTA",
+                     help=f"Guarda los resultados como línea base (por defecto {BASELINE_PATH}).")
+    run.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                     help="Aumento relativo del tiempo mínimo que se considera regresión.")
+
+    generate = commands.add_parser("generate", help="Escribe CSV sintéticos y su manifest.json.")
+    generate.add_argument("--output-dir", required=True)
+    generate.add_argument("--count", type=int, default=2)
+    generate.add_argument("--days", type=int, default=FULL_DAYS)
+
+    serve = commands.add_parser("serve", help="Sirve escenarios sintéticos como Google Drive.")
+    serve.add_argument("--host", default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=8766)
+    serve.add_argument("--days", type=int, default=FULL_DAYS)
+    serve.add_argument("--latency", type=float, default=0.0)
+    args = parser.parse_args(argv)
+
+    if args.command == "generate":
+        names = write_synthetic(args.output_dir, args.count, args.days)
+        print(f"{len(names)} escenarios sintéticos escritos en {args.output_dir}.")
+        return 0
+
+    if args.command == "serve":
+        server = DriveStandIn(host=args.host, port=args.port, latency=args.latency, n_days=args.days)
+        print(f"OWF_DRIVE_URL='{server.url_template}'", file=sys.stderr)
+        server.serve_forever()
+        return 0
+
+    baseline = None
+    if args.baseline:
+        try:
+            with open(args.baseline, "r", encoding="utf-8") as f:
+                baseline = json.load(f)
+        except (OSError, ValueError) as e:
+            parser.error(f"No se pudo leer la línea base: {e}")
+
+    counts = sorted({1, 2, max(args.scenarios, 1)})
+
+    def report(name, result):
+        print(f"{name}: {result['min_ms']:.1f} ms (mediana {result['median_ms']:.1f} ms)", file=sys.stderr)
+
+    current = run_benchmarks(counts, args.days, args.repeat, args.latency, args.only, progress=report)
+    _print_results(current['results'])
+
+    for path in filter(None, [args.output, args.save_baseline]):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(current, f, indent=2)
+        print(f"Resultados guardados en {path}.")
+
+    if baseline is None:
+        return 0
+    if baseline['meta'].get('days') != current['meta']['days']:
+        print(f"Aviso: la línea base usa {baseline['meta'].get('days')} días y esta medición {current['meta']['days']}.",
+              file=sys.stderr)
+    comparison = compare_to_baseline(current, baseline, args.tolerance)
+    print(comparison.to_string(index=False, float_format=lambda value: f"{value:.2f}"))
+    regressions = comparison.loc[comparison['Regresión'], 'Medición'].tolist()
+    if regressions:
+        print(f"Regresiones (> {args.tolerance:.0%} más lento): {', '.join(regressions)}")
+        return 1
+    print("Sin regresiones respecto de la línea base.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
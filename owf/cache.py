@@ -0,0 +1,169 @@
+"""Caché de escenarios en memoria, compartida por todo el proceso.
+
+A diferencia de ``st.cache_data``, que serializa y copia el DataFrame en cada
+acceso, esta caché guarda un único DataFrame de solo lectura por escenario y
+entrega siempre el mismo objeto. El uso de memoria está limitado por un
+presupuesto en bytes con expulsión LRU, y se llevan contadores de aciertos,
+fallos y expulsiones. Como vive a nivel de módulo, la comparten todas las
+sesiones de Streamlit del mismo proceso.
+
+``RESULT_CACHE`` usa la misma estructura para los resultados derivados
+(métricas por escenario y figuras), con su propio presupuesto.
+"""
+import os
+import sys
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+CACHE_MAX_BYTES = int(os.environ.get("OWF_CACHE_MAX_BYTES", 1024 ** 3))
+RESULT_CACHE_MAX_BYTES = int(os.environ.get("OWF_RESULT_CACHE_MAX_BYTES", 256 * 1024 ** 2))
+
+
+def read_only_frame(df):
+    """Devuelve un DataFrame equivalente de solo lectura; no copia los valores si forman un único bloque.
+
+    Los DataFrames del almacén (una vista de solo lectura por columna, ver ``owf.store``)
+    se devuelven tal cual para no copiar los bloques que comparten con otros escenarios.
+    """
+    if df.empty or df.dtypes.nunique() != 1:
+        return df
+    if all(not df[col].to_numpy().flags.writeable for col in df.columns):
+        return df
+    values = df.to_numpy().view()
+    values.flags.writeable = False
+    return pd.DataFrame(values, index=df.index, columns=df.columns, copy=False)
+
+
+def frame_nbytes(df):
+    """Bytes ocupados por los valores e índice del DataFrame."""
+    return int(df.memory_usage(index=True, deep=False).sum())
+
+
+def object_nbytes(value):
+    """Estimación de los bytes de un resultado derivado (DataFrames, arreglos, figuras y contenedores)."""
+    if value is None:
+        return 0
+    if isinstance(value, pd.DataFrame):
+        return frame_nbytes(value)
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(index=True, deep=False))
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, dict):
+        return sum(object_nbytes(item) for item in value.values())
+    if isinstance(value, (tuple, list)):
+        return sum(object_nbytes(item) for item in value)
+    if hasattr(value, 'to_json'):
+        # Figuras de Plotly: el tamaño de lo que se envía al navegador.
+        return len(value.to_json())
+    return sys.getsizeof(value)
+
+
+class ScenarioCache:
+    """Caché LRU con presupuesto en bytes y contadores de uso.
+
+    Por omisión guarda DataFrames de escenarios; ``sizeof`` y ``freeze`` permiten
+    guardar otros valores (``freeze`` prepara el valor antes de compartirlo).
+    """
+
+    def __init__(self, max_bytes=CACHE_MAX_BYTES, sizeof=frame_nbytes, freeze=read_only_frame):
+        self.max_bytes = max_bytes
+        self._sizeof = sizeof
+        self._freeze = freeze
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._loading = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, count=True):
+        """Devuelve el valor asociado a ``key`` o ``None``; con ``count=False`` no toca los contadores."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                if count:
+                    self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            if count:
+                self.hits += 1
+            return entry[0]
+
+    def put(self, key, df):
+        """Guarda ``df`` como solo lectura y lo devuelve. No se guarda si supera el presupuesto."""
+        if self._freeze is not None:
+            df = self._freeze(df)
+        size = self._sizeof(df)
+        with self._lock:
+            if key in self._entries:
+                self._bytes -= self._entries.pop(key)[1]
+            if size > self.max_bytes:
+                return df
+            self._entries[key] = (df, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+        return df
+
+    def get_or_load(self, key, loader, count=True):
+        """Devuelve ``(df, acierto)``; si no está, llama a ``loader()`` una sola vez por clave.
+
+        Si varias sesiones piden a la vez el mismo escenario, solo una lo carga y
+        las demás esperan su resultado. Cada llamada cuenta un único acierto o
+        fallo (ninguno con ``count=False``): las que esperan cuentan un acierto.
+        """
+        df = self.get(key, count=False)
+        if df is None:
+            with self._lock:
+                key_lock = self._loading.setdefault(key, threading.Lock())
+            with key_lock:
+                with self._lock:
+                    entry = self._entries.get(key)
+                    if entry is not None:
+                        self._entries.move_to_end(key)
+                        df = entry[0]
+                    elif count:
+                        self.misses += 1
+                if df is None:
+                    try:
+                        df = loader()
+                        if df is not None:
+                            df = self.put(key, df)
+                    finally:
+                        with self._lock:
+                            self._loading.pop(key, None)
+                    return df, False
+        if count:
+            with self._lock:
+                self.hits += 1
+        return df, True
+
+    def clear(self):
+        """Vacía la caché (los contadores se conservan)."""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        """Contadores y ocupación actual de la caché."""
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+            }
+
+
+# Instancias únicas del proceso, compartidas entre sesiones.
+SCENARIO_CACHE = ScenarioCache()
+RESULT_CACHE = ScenarioCache(RESULT_CACHE_MAX_BYTES, sizeof=object_nbytes, freeze=None)
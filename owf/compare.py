@@ -0,0 +1,338 @@
+"""Núcleo de la comparación de dos escenarios, independiente de Streamlit.
+
+Reúne la carga de datos (cubo precalculado o CSV completos), los agregados y
+las figuras de una comparación. La aplicación (``app.py``) y el generador de
+informes por lotes (``owf.report``) usan las mismas funciones.
+
+Los resultados se memorizan en ``RESULT_CACHE`` por escenario y métrica
+(clave ``(origen, archivo, métrica)``), y las figuras por par de escenarios.
+Al cambiar solo uno de los dos escenarios, el otro no se vuelve a cargar ni
+agregar, y volver a una comparación reciente reutiliza sus figuras.
+"""
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from owf.aggregate import KINDS, aggregate_scenario, daily_totals
+from owf.cache import RESULT_CACHE
+from owf.deficit import METRIC_LABELS, scenario_deficits
+from owf import figures, perf
+from owf.ensemble import annual_ensemble, replica_params
+from owf.fetch import fetch_scenarios
+from owf.maps import load_basins, stress_ratios
+from owf.schema import scenario_file_name
+
+# Cada campo es un par (escenario 1, escenario 2), o ``None`` si no está disponible.
+Comparison = namedtuple("Comparison", [
+    "annual_supply",   # pd.Series de totales anuales de oferta
+    "annual_demand",   # pd.Series de totales anuales de demanda
+    "monthly_supply",  # BoxStats mensual de la oferta
+    "monthly_demand",  # BoxStats mensual de la demanda
+    "composition",     # pd.DataFrame: Componente, Porcentaje
+    "daily_supply",    # pd.Series diaria (solo con los datos completos)
+    "daily_demand",
+    "annual_bands",    # {'supply': par, 'demand': par} de bandas del ensamble
+    "stress",          # pd.Series de estrés por subcuenca (solo con los datos completos)
+    "deficits",        # pd.DataFrame (subcuenca x métrica) de ``owf.deficit``
+    "key",             # clave de la comparación para memorizar sus figuras (o ``None``)
+])
+
+# Sección del informe: título, figuras (``None`` si no hay datos) y tablas (etiqueta, DataFrame).
+Section = namedtuple("Section", ["title", "figures", "tables"])
+
+RAW_METRICS = ['annual_supply', 'annual_demand', 'box_supply', 'box_demand', 'composition',
+               'daily_supply', 'daily_demand', 'stress', 'deficits']
+CUBE_METRICS = ['annual_supply', 'annual_demand', 'box_supply', 'box_demand', 'composition', 'deficits']
+
+
+# Se memoriza en lugar de ``None`` para las métricas que no existen (p. ej. el
+# déficit en un cubo construido antes de esas métricas), para no recalcularlas.
+_ABSENT = object()
+
+
+def cached_metrics(source, file_name, names):
+    """Métricas memorizadas de un escenario, o ``None`` si falta alguna."""
+    values = {name: RESULT_CACHE.get((source, file_name, name)) for name in names}
+    missing = any(value is None for value in values.values())
+    perf.count("cache.results.miss" if missing else "cache.results.hit")
+    if missing:
+        return None
+    return {name: None if value is _ABSENT else value for name, value in values.items()}
+
+
+def remember_metrics(source, file_name, values):
+    """Memoriza las métricas de un escenario; las ``None`` se recuerdan como ausentes."""
+    for name, value in values.items():
+        RESULT_CACHE.put((source, file_name, name), _ABSENT if value is None else value)
+    return values
+
+
+def _ensemble_key(scenario_params):
+    # Las bandas dependen de la configuración, no de la réplica elegida.
+    return scenario_file_name(replica_params(scenario_params)[0])
+
+
+def aggregates_metrics(aggregates):
+    """Métricas por escenario que usa la comparación, a partir de los agregados completos."""
+    with perf.span("metrics.stress"):
+        stress = stress_ratios(aggregates.subbasin_annual_supply, aggregates.subbasin_annual_demand)
+    with perf.span("metrics.deficits"):
+        deficits = scenario_deficits(aggregates)
+    return {
+        'annual_supply': aggregates.annual_supply,
+        'annual_demand': aggregates.annual_demand,
+        'box_supply': aggregates.box_supply,
+        'box_demand': aggregates.box_demand,
+        'composition': aggregates.composition,
+        'daily_supply': aggregates.daily_supply,
+        'daily_demand': aggregates.daily_demand,
+        'stress': stress,
+        'deficits': deficits,
+    }
+
+
+def cube_metrics(cube, scenario_params, ensemble=False):
+    """Métricas por escenario respondidas por el cubo, memorizadas."""
+    file_name = scenario_file_name(scenario_params)
+    metrics = cached_metrics('cube', file_name, CUBE_METRICS)
+    if metrics is None:
+        with perf.span("cube.lookup"):
+            metrics = remember_metrics('cube', file_name, {
+                'annual_supply': cube.annual_totals(scenario_params, 'supply'),
+                'annual_demand': cube.annual_totals(scenario_params, 'demand'),
+                'box_supply': cube.monthly_box(scenario_params, 'supply'),
+                'box_demand': cube.monthly_box(scenario_params, 'demand'),
+                'composition': cube.composition(scenario_params),
+                'deficits': cube.deficit_table(scenario_params),
+            })
+    if ensemble:
+        config = _ensemble_key(scenario_params)
+        bands = cached_metrics('cube', config, ['bands'])
+        if bands is None:
+            with perf.span("cube.ensemble"):
+                bands = remember_metrics('cube', config, {
+                    'bands': {kind: cube.annual_ensemble(scenario_params, kind) for kind in KINDS},
+                })
+        metrics = {**metrics, **bands}
+    return metrics
+
+
+def raw_source(window=None):
+    """Origen de las métricas memorizadas con los datos completos, distinto para cada ventana de años."""
+    return 'raw' if window is None else f"raw@{window[0]}-{window[1]}"
+
+
+def _usable(df):
+    return df is not None and not df.empty
+
+
+def raw_metrics(scenarios_params, load_frames, ensemble=False, window=None):
+    """Métricas por escenario a partir de los datos completos, memorizadas.
+
+    ``load_frames`` recibe una lista de parámetros y devuelve sus DataFrames (vacíos
+    o ``None`` si fallan), ya recortados a ``window`` si se indica; solo se llama,
+    en un único lote, con los escenarios (y réplicas) cuyas métricas no están
+    memorizadas. Devuelve un diccionario por escenario, o ``None`` si no se pudo cargar.
+    """
+    source = raw_source(window)
+    metrics = [cached_metrics(source, scenario_file_name(params), RAW_METRICS) for params in scenarios_params]
+    bands = [cached_metrics(source, _ensemble_key(params), ['bands']) if ensemble else {} for params in scenarios_params]
+
+    # Las réplicas cuyas métricas ya se conocen aportan sus totales diarios memorizados.
+    known = {scenario_file_name(params) for params, values in zip(scenarios_params, metrics) if values is not None}
+    to_load = {}
+    for params, values, band in zip(scenarios_params, metrics, bands):
+        if values is None:
+            to_load[scenario_file_name(params)] = params
+        if band is None:
+            to_load.update((scenario_file_name(replica), replica) for replica in replica_params(params)
+                           if scenario_file_name(replica) not in known)
+    frames = dict(zip(to_load, load_frames(list(to_load.values())))) if to_load else {}
+
+    for i, params in enumerate(scenarios_params):
+        file_name = scenario_file_name(params)
+        if metrics[i] is None and _usable(frames.get(file_name)):
+            with perf.span("aggregate"):
+                aggregates = aggregate_scenario(frames[file_name])
+            metrics[i] = remember_metrics(source, file_name, aggregates_metrics(aggregates))
+    daily = {scenario_file_name(params): pd.DataFrame({'supply': values['daily_supply'], 'demand': values['daily_demand']})
+             for params, values in zip(scenarios_params, metrics) if values is not None}
+
+    def replica_daily(name):
+        # Solo se suman las columnas de oferta y demanda; el escenario elegido ya está agregado.
+        if name not in daily and _usable(frames.get(name)):
+            daily[name] = daily_totals(frames[name])
+        return daily.get(name)
+
+    results = []
+    for params, values, band in zip(scenarios_params, metrics, bands):
+        if band is None:
+            with perf.span("ensemble"):
+                replicas = [replica_daily(name) for name in map(scenario_file_name, replica_params(params))]
+                replicas = [totals for totals in replicas if totals is not None]
+                band = remember_metrics(source, _ensemble_key(params), {'bands': annual_ensemble(replicas)}) if replicas else {}
+        results.append(None if values is None else {**values, **band})
+    return results
+
+
+def comparison_from_metrics(s1_metrics, s2_metrics, key=None):
+    """Comparación a partir de las métricas de cada escenario (``raw_metrics`` o ``cube_metrics``)."""
+    def pair(name):
+        if s1_metrics.get(name) is None or s2_metrics.get(name) is None:
+            return None
+        return s1_metrics[name], s2_metrics[name]
+
+    bands = pair('bands')
+    return Comparison(
+        annual_supply=pair('annual_supply'),
+        annual_demand=pair('annual_demand'),
+        monthly_supply=pair('box_supply'),
+        monthly_demand=pair('box_demand'),
+        composition=pair('composition'),
+        daily_supply=pair('daily_supply'),
+        daily_demand=pair('daily_demand'),
+        annual_bands=None if bands is None else {kind: (bands[0][kind], bands[1][kind]) for kind in KINDS},
+        stress=pair('stress'),
+        deficits=pair('deficits'),
+        key=key,
+    )
+
+
+def comparison_key(source, s1_params, s2_params, ensemble=False):
+    """Clave de una comparación para memorizar sus figuras."""
+    return (source, scenario_file_name(s1_params), scenario_file_name(s2_params), bool(ensemble))
+
+
+def comparison_from_cube(cube, s1_params, s2_params, ensemble=False):
+    """Comparación respondida por el cubo de agregados, sin descargar datos."""
+    return comparison_from_metrics(cube_metrics(cube, s1_params, ensemble), cube_metrics(cube, s2_params, ensemble),
+                                   key=comparison_key('cube', s1_params, s2_params, ensemble))
+
+
+def raw_comparison(s1_params, s2_params, load_frames, ensemble=False, window=None):
+    """Comparación con los datos completos (o su ventana de años), o ``None`` si falta alguno de los escenarios."""
+    s1_metrics, s2_metrics = raw_metrics([s1_params, s2_params], load_frames, ensemble, window)
+    if s1_metrics is None or s2_metrics is None:
+        return None
+    return comparison_from_metrics(s1_metrics, s2_metrics,
+                                   key=comparison_key(raw_source(window), s1_params, s2_params, ensemble))
+
+
+def fetch_by_params(scenarios_params, manifest_index, **fetch_options):
+    """Descarga en paralelo los escenarios, conservando el orden.
+
+    Devuelve un ``FetchResult`` por escenario, o ``None`` si no está en el manifiesto.
+    """
+    items = []
+    for params in scenarios_params:
+        file_id = manifest_index.lookup(params)
+        if file_id:
+            items.append((scenario_file_name(params), file_id))
+    results = {result.file_name: result for result in fetch_scenarios(items, **fetch_options)}
+    return [results.get(scenario_file_name(params)) for params in scenarios_params]
+
+
+def use_cube(cube, s1_params, s2_params, daily_detail=False, window=None):
+    """Indica si la comparación se puede responder con el cubo (que cubre toda la serie, sin ventana)."""
+    return (not daily_detail and window is None and cube is not None
+            and cube.contains(s1_params) and cube.contains(s2_params))
+
+
+def build_comparison(s1_params, s2_params, manifest_index, cube=None, daily_detail=False, ensemble=False, window=None):
+    """Carga y agrega una comparación completa, como la aplicación.
+
+    Usa el cubo si contiene ambos escenarios, no se pide el detalle diario ni una
+    ventana de años. Devuelve ``(Comparison, errores)``; la comparación es ``None``
+    si falta algún escenario.
+    """
+    if use_cube(cube, s1_params, s2_params, daily_detail, window):
+        return comparison_from_cube(cube, s1_params, s2_params, ensemble), []
+
+    errors = []
+
+    def load_frames(scenarios_params):
+        results = fetch_by_params(scenarios_params, manifest_index, window=window)
+        for params, result in zip(scenarios_params, results):
+            if result is None:
+                errors.append(f"{scenario_file_name(params)}: no está en el manifiesto")
+            elif result.error is not None:
+                errors.append(f"{scenario_file_name(params)}: {result.error}")
+        return [None if result is None or result.error is not None else result.data for result in results]
+
+    return raw_comparison(s1_params, s2_params, load_frames, ensemble, window), errors
+
+
+def cached_figure(key, build):
+    """Figura memorizada bajo ``key`` (se construye con ``build()`` si falta; sin clave no se memoriza).
+
+    Se guarda la figura ya validada y no su JSON: reconstruir un ``go.Figure``
+    desde JSON vuelve a validar cada trazo y cuesta tanto como construirlo.
+    """
+    name = f"figure.{key[-1]}" if key is not None else "figure"
+
+    def timed_build():
+        with perf.span(name):
+            return build()
+
+    if key is None:
+        return timed_build()
+    fig, hit = RESULT_CACHE.get_or_load(('figure',) + key, timed_build)
+    perf.count("cache.figures.hit" if hit else "cache.figures.miss")
+    return fig
+
+
+def comparison_sections(comparison, map_detail='media'):
+    """Secciones de la comparación en el orden en que se presentan."""
+    bands = comparison.annual_bands or {}
+
+    def figure(name, build):
+        return cached_figure(None if comparison.key is None else comparison.key + (name,), build)
+
+    sections = [
+        Section("Análisis de Oferta Hídrica", [
+            figure('annual_supply', lambda: figures.line_comparison(
+                *comparison.annual_supply, "Oferta Hídrica Anual Total", "Oferta (cmd)", bands=bands.get('supply'))),
+            figure('box_supply', lambda: figures.boxplot_comparison(
+                *comparison.monthly_supply, "Distribución Mensual de Oferta Hídrica", "Oferta (cmd)")),
+        ], []),
+        Section("Análisis de Demanda Hídrica", [
+            figure('annual_demand', lambda: figures.line_comparison(
+                *comparison.annual_demand, "Demanda Hídrica Anual Total", "Demanda (cmd)", bands=bands.get('demand'))),
+            figure('box_demand', lambda: figures.boxplot_comparison(
+                *comparison.monthly_demand, "Distribución Mensual de Demanda Hídrica", "Demanda (cmd)")),
+        ], []),
+    ]
+    if comparison.daily_supply is not None and comparison.daily_demand is not None:
+        sections.append(Section("Series Diarias", [
+            figure('daily_supply', lambda: figures.daily_comparison(
+                *comparison.daily_supply, "Oferta Hídrica Diaria Total", "Oferta (cmd)")),
+            figure('daily_demand', lambda: figures.daily_comparison(
+                *comparison.daily_demand, "Demanda Hídrica Diaria Total", "Demanda (cmd)")),
+        ], []))
+    sections.append(Section("Análisis de Composición de la Demanda",
+                            [figure('composition', lambda: figures.composition_comparison(*comparison.composition))], []))
+    if comparison.stress is not None:
+        maps = figure(f'stress_{map_detail}', lambda: figures.stress_maps(*comparison.stress, load_basins(map_detail)))
+        sections.append(Section("Estrés Hídrico por Subcuenca", list(maps), []))
+    if comparison.deficits is not None:
+        sections.append(Section(
+            "Déficit y Confiabilidad por Subcuenca",
+            [figure('deficits', lambda: figures.deficit_comparison(*comparison.deficits))],
+            [(name, table.rename(columns=METRIC_LABELS)) for name, table in zip(figures.SCENARIO_NAMES, comparison.deficits)],
+        ))
+    return sections
+
+
+def summary_row(comparison):
+    """Resumen numérico de una comparación (una fila por par de escenarios)."""
+    row = {}
+    for i in range(2):
+        suffix = f"E{i + 1}"
+        row[f"Oferta anual media (cmd) {suffix}"] = float(comparison.annual_supply[i].mean())
+        row[f"Demanda anual media (cmd) {suffix}"] = float(comparison.annual_demand[i].mean())
+        if comparison.deficits is not None:
+            table = comparison.deficits[i]
+            row[f"Confiabilidad volumétrica media {suffix}"] = float(np.nanmean(table['volumetric_reliability']))
+            row[f"Subcuencas con déficit {suffix}"] = int((table['frequency'] > 0).sum())
+    return row
@@ -0,0 +1,213 @@
+"""Cubo precalculado de agregados para toda la malla de escenarios del manifiesto.
+
+El cubo es un conjunto de arreglos NumPy densos indexados por los siete ejes de
+``SCENARIO_AXES`` (política x réplica x DT x DP x FW x Irr x Liv). Guarda los
+totales anuales de oferta y demanda, los cuantiles mensuales de los totales
+diarios, la composición de la demanda y las métricas de déficit por subcuenca
+(``owf.deficit``), de modo que la mayoría de las
+comparaciones se responden por indexación sin descargar el CSV original.
+
+Construcción (paso fuera de línea)::
+
+    python -m owf.cube --manifest soporte/manifest.json --output soporte/cubo.npz
+"""
+import argparse
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+from owf.aggregate import BoxStats, COMPOSITION_COMPONENTS, KINDS, MONTHS, QUANTILES, aggregate_scenario, monthly_stats_frame, year_end_index
+from owf.deficit import DEFICIT_METRICS, deficit_metrics, metrics_frame
+from owf.fetch import fetch_scenarios
+from owf.manifest import MANIFEST_PATH, load_manifest_index
+from owf.ensemble import BAND_COLUMNS, BAND_PERCENTILES, bands_frame, ensemble_bands
+from owf.schema import GRID_SHAPE, SCENARIO_AXES, SUBBASINS, scenario_file_name, scenario_index
+
+CUBE_PATH = os.environ.get("OWF_CUBE_PATH", os.path.join("soporte", "cubo.npz"))
+CUBE_SHAPE = GRID_SHAPE
+RUN_AXIS = [name for name, _ in SCENARIO_AXES].index('run')
+
+
+def scenario_aggregates(df):
+    """Calcula los agregados del cubo para un escenario cargado."""
+    aggregates = aggregate_scenario(df)
+    shares = dict(zip(aggregates.composition.get('Componente', []), aggregates.composition.get('Porcentaje', [])))
+    deficits = deficit_metrics(aggregates.subbasin_supply[SUBBASINS].to_numpy(), aggregates.subbasin_demand[SUBBASINS].to_numpy())
+    return {
+        'years': aggregates.annual_supply.index.year.to_numpy(),
+        'annual': np.vstack([aggregates.annual_supply.to_numpy(), aggregates.annual_demand.to_numpy()]),
+        'monthly': aggregates.monthly_quantiles,
+        'shares': np.array([shares.get(name, np.nan) for name in COMPOSITION_COMPONENTS]),
+        'deficits': np.stack([deficits[name] for name in DEFICIT_METRICS]),
+    }
+
+
+class ScenarioCube:
+    """Lector en tiempo de ejecución del cubo de agregados."""
+
+    def __init__(self, years, annual, monthly, shares, available, deficits=None):
+        self.years = years
+        self.annual = annual
+        self.monthly = monthly
+        self.shares = shares
+        self.available = available
+        # Los cubos construidos antes de las métricas de déficit no tienen este arreglo.
+        self.deficits = deficits
+
+    @classmethod
+    def empty(cls, years):
+        """Crea un cubo vacío (todo NaN) para el eje de años dado."""
+        return cls(
+            years=np.asarray(years),
+            annual=np.full(CUBE_SHAPE + (len(KINDS), len(years)), np.nan, dtype=np.float32),
+            monthly=np.full(CUBE_SHAPE + (len(KINDS), len(MONTHS), len(QUANTILES)), np.nan, dtype=np.float32),
+            shares=np.full(CUBE_SHAPE + (len(COMPOSITION_COMPONENTS),), np.nan, dtype=np.float32),
+            available=np.zeros(CUBE_SHAPE, dtype=bool),
+            deficits=np.full(CUBE_SHAPE + (len(DEFICIT_METRICS), len(SUBBASINS)), np.nan, dtype=np.float32),
+        )
+
+    @classmethod
+    def load(cls, path=CUBE_PATH):
+        """Carga el cubo desde un archivo ``.npz``."""
+        with np.load(path) as data:
+            arrays = {name: data[name] for name in ('years', 'annual', 'monthly', 'shares', 'available')}
+            if 'deficits' in data.files:
+                arrays['deficits'] = data['deficits']
+            return cls(**arrays)
+
+    def save(self, path=CUBE_PATH):
+        """Guarda el cubo de forma atómica en un archivo ``.npz`` comprimido."""
+        tmp_path = f"{path}.tmp.npz"
+        arrays = dict(years=self.years, annual=self.annual, monthly=self.monthly, shares=self.shares, available=self.available)
+        if self.deficits is not None:
+            arrays['deficits'] = self.deficits
+        np.savez_compressed(tmp_path, **arrays)
+        os.replace(tmp_path, path)
+
+    def set(self, index, aggregates):
+        """Guarda los agregados de un escenario, alineándolos con el eje de años del cubo."""
+        positions = np.searchsorted(self.years, aggregates['years'])
+        inside = (positions < len(self.years)) & (self.years[np.minimum(positions, len(self.years) - 1)] == aggregates['years'])
+        self.annual[index][:, positions[inside]] = aggregates['annual'][:, inside]
+        self.monthly[index] = aggregates['monthly']
+        self.shares[index] = aggregates['shares']
+        if self.deficits is None:
+            self.deficits = np.full(CUBE_SHAPE + (len(DEFICIT_METRICS), len(SUBBASINS)), np.nan, dtype=np.float32)
+        self.deficits[index] = aggregates['deficits']
+        self.available[index] = True
+
+    def contains(self, scenario_params):
+        """Indica si el cubo tiene agregados para el escenario."""
+        try:
+            return bool(self.available[scenario_index(scenario_params)])
+        except ValueError:
+            return False
+
+    def annual_totals(self, scenario_params, kind):
+        """Serie de totales anuales (``kind`` es 'supply' o 'demand'), como ``get_annual_totals``."""
+        values = self.annual[scenario_index(scenario_params)][KINDS.index(kind)]
+        valid = ~np.isnan(values)
+        return pd.Series(values[valid].astype(float), index=year_end_index(self.years[valid]), name='Total')
+
+    def annual_ensemble(self, scenario_params, kind, percentiles=BAND_PERCENTILES):
+        """Bandas de los totales anuales entre las réplicas de la configuración (ignora 'run')."""
+        index = list(scenario_index(scenario_params))
+        index[RUN_AXIS] = slice(None)
+        values = self.annual[tuple(index)][:, KINDS.index(kind), :].astype(float)
+        available = self.available[tuple(index)]
+        if not available.any():
+            return pd.DataFrame(columns=BAND_COLUMNS)
+        bands = ensemble_bands(values[available], percentiles)
+        valid = ~np.isnan(bands[0])
+        return bands_frame(bands[:, valid], year_end_index(self.years[valid]))
+
+    def monthly_box(self, scenario_params, kind):
+        """Cajas mensuales de los totales diarios, con bigotes en el mínimo y el máximo.
+
+        El cubo solo guarda cuantiles, así que no hay bigotes de Tukey ni valores
+        atípicos; la figura lo indica en el título.
+        """
+        stats = monthly_stats_frame(self.monthly[scenario_index(scenario_params)][KINDS.index(kind)])
+        return BoxStats(stats, pd.DataFrame(columns=['Month', 'Total']), whiskers='minmax')
+
+    def composition(self, scenario_params):
+        """Composición porcentual de la demanda, como ``get_annual_composition``."""
+        shares = self.shares[scenario_index(scenario_params)]
+        rows = [(name, float(value)) for name, value in zip(COMPOSITION_COMPONENTS, shares) if not np.isnan(value)]
+        return pd.DataFrame(rows, columns=['Componente', 'Porcentaje'])
+
+    def deficit_table(self, scenario_params):
+        """Tabla (subcuenca x métrica) de déficit, o ``None`` si el cubo no tiene estas métricas."""
+        if self.deficits is None:
+            return None
+        values = self.deficits[scenario_index(scenario_params)].astype(float)
+        if np.isnan(values).all():
+            return None
+        return metrics_frame(dict(zip(DEFICIT_METRICS, values)))
+
+
+def load_cube(path=CUBE_PATH):
+    """Carga el cubo si existe; devuelve ``None`` si no está disponible."""
+    if not os.path.exists(path):
+        return None
+    try:
+        return ScenarioCube.load(path)
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def build_cube(manifest_index, output=CUBE_PATH, workers=None, chunk_size=64, resume=False, checkpoint_every=20, progress=None):
+    """Descarga cada escenario del manifiesto, calcula sus agregados y los guarda en el cubo."""
+    cube = load_cube(output) if resume else None
+    pending = [(index, scenario_file_name(params), file_id) for index, params, file_id in manifest_index.items()
+               if not (cube is not None and cube.available[index])]
+
+    failed = []
+    for chunk_number, start in enumerate(range(0, len(pending), chunk_size), start=1):
+        chunk = pending[start:start + chunk_size]
+        results = fetch_scenarios([(name, file_id) for _, name, file_id in chunk], max_workers=workers, use_store=False, use_cache=False)
+        for (index, _, _), result in zip(chunk, results):
+            if result.error is not None:
+                failed.append((result.file_name, str(result.error)))
+                continue
+            aggregates = scenario_aggregates(result.data)
+            if cube is None:
+                cube = ScenarioCube.empty(aggregates['years'])
+            cube.set(index, aggregates)
+        if progress:
+            progress(min(start + chunk_size, len(pending)), len(pending))
+        if cube is not None and chunk_number % checkpoint_every == 0:
+            cube.save(output)
+
+    if cube is not None:
+        cube.save(output)
+    return cube, failed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Construye el cubo de agregados de escenarios OWF.")
+    parser.add_argument("--manifest", default=MANIFEST_PATH)
+    parser.add_argument("--output", default=CUBE_PATH)
+    parser.add_argument("--workers", type=int, default=None, help="Descargas simultáneas.")
+    parser.add_argument("--chunk-size", type=int, default=64)
+    parser.add_argument("--resume", action="store_true", help="Omite los escenarios ya presentes en el cubo.")
+    args = parser.parse_args(argv)
+
+    manifest_index = load_manifest_index(args.manifest)
+
+    def report(done, total):
+        print(f"{done}/{total} escenarios procesados", file=sys.stderr)
+
+    cube, failed = build_cube(manifest_index, args.output, args.workers, args.chunk_size, args.resume, progress=report)
+    for file_name, error in failed:
+        print(f"Error en {file_name}: {error}", file=sys.stderr)
+    if cube is None:
+        return 1
+    print(f"Cubo guardado en {args.output}: {int(cube.available.sum())}/{cube.available.size} escenarios.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
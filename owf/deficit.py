@@ -0,0 +1,142 @@
+"""Déficit y confiabilidad por subcuenca.
+
+Para cada subcuenca se compara la oferta diaria (``To_downstream_from_<X>_cmd``)
+con la suma de sus componentes de demanda (``Denv/Dfwr/Dfwu/Dirr/Dliv_<X>_cmd``).
+Todas las métricas se calculan sobre la matriz completa (tiempo x subcuenca) sin
+bucles de Python, incluida la detección de rachas de déficit. Las funciones
+aceptan ejes iniciales adicionales (escenario x tiempo x subcuenca), de modo
+que se pueden evaluar lotes de escenarios en una sola llamada.
+
+Métricas (índices de Hashimoto et al., 1982):
+
+- ``frequency``: fracción de días con déficit.
+- ``longest_run``: racha más larga de días consecutivos con déficit.
+- ``events``: número de episodios de déficit.
+- ``shortfall``: volumen total no atendido (suma de demanda - oferta en días con déficit).
+- ``reliability``: confiabilidad temporal (1 - ``frequency``).
+- ``volumetric_reliability``: 1 - ``shortfall`` / demanda total.
+- ``resilience``: probabilidad de salir del déficit al día siguiente (episodios / días con déficit).
+- ``vulnerability``: volumen medio no atendido por episodio.
+- ``max_event_shortfall``: volumen no atendido del peor episodio.
+"""
+import numpy as np
+import pandas as pd
+
+from owf.schema import SUBBASINS
+
+DEFICIT_METRICS = [
+    'frequency', 'longest_run', 'events', 'shortfall', 'reliability',
+    'volumetric_reliability', 'resilience', 'vulnerability', 'max_event_shortfall',
+]
+METRIC_LABELS = {
+    'frequency': "Frecuencia de déficit",
+    'longest_run': "Racha más larga (días)",
+    'events': "Episodios de déficit",
+    'shortfall': "Volumen no atendido (cmd·día)",
+    'reliability': "Confiabilidad temporal",
+    'volumetric_reliability': "Confiabilidad volumétrica",
+    'resilience': "Resiliencia",
+    'vulnerability': "Vulnerabilidad (cmd·día/episodio)",
+    'max_event_shortfall': "Peor episodio (cmd·día)",
+}
+
+
+def run_lengths(mask, axis=-2):
+    """Longitud de la racha de ``True`` que termina en cada posición, a lo largo de ``axis``."""
+    counts = np.cumsum(mask, axis=axis)
+    # Valor del contador en el último ``False`` anterior: se resta para reiniciar cada racha.
+    resets = np.maximum.accumulate(np.where(mask, 0, counts), axis=axis)
+    return counts - resets
+
+
+def _event_shortfalls(in_deficit, shortfall):
+    """Volumen de cada episodio de déficit y a qué serie pertenece.
+
+    Recibe arreglos (serie x tiempo); se rellena con un día sin déficit a cada lado
+    para que ningún episodio cruce de una serie a la siguiente.
+    """
+    n_series = in_deficit.shape[0]
+    padded = np.pad(in_deficit, ((0, 0), (1, 1))).ravel()
+    edges = np.diff(padded.astype(np.int8))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+
+    cumulative = np.concatenate([[0], np.cumsum(np.pad(shortfall, ((0, 0), (1, 1))).ravel())])
+    volumes = cumulative[ends + 1] - cumulative[starts + 1]
+    series = starts // (in_deficit.shape[1] + 2)
+    return volumes, series, n_series
+
+
+def deficit_metrics(supply, demand):
+    """Métricas de déficit por subcuenca para arreglos (..., tiempo, subcuenca).
+
+    Devuelve un diccionario ``{métrica: arreglo (..., subcuenca)}`` con las
+    métricas de ``DEFICIT_METRICS``.
+    """
+    supply = np.asarray(supply, dtype=float)
+    demand = np.asarray(demand, dtype=float)
+    gap = demand - supply
+    in_deficit = gap > 0
+    shortfall = np.where(in_deficit, gap, 0.0)
+    n_days = gap.shape[-2]
+    lead_shape = gap.shape[:-2] + gap.shape[-1:]
+    if n_days == 0:
+        # Sin días (p. ej. escenarios o ventanas sin fechas en común): no hay déficit que medir.
+        zeros, missing = np.zeros(lead_shape), np.full(lead_shape, np.nan)
+        return {
+            'frequency': missing, 'longest_run': zeros.astype(int), 'events': zeros.astype(int), 'shortfall': zeros,
+            'reliability': missing, 'volumetric_reliability': missing, 'resilience': missing,
+            'vulnerability': zeros, 'max_event_shortfall': zeros,
+        }
+
+    deficit_days = in_deficit.sum(axis=-2)
+    starts = in_deficit & ~np.concatenate([np.zeros_like(in_deficit[..., :1, :]), in_deficit[..., :-1, :]], axis=-2)
+    events = starts.sum(axis=-2)
+    total_shortfall = shortfall.sum(axis=-2)
+    total_demand = demand.sum(axis=-2)
+
+    # Volumen por episodio: se pasa a (serie x tiempo) con una serie por (escenario, subcuenca).
+    volumes, series, n_series = _event_shortfalls(
+        np.moveaxis(in_deficit, -2, -1).reshape(-1, n_days),
+        np.moveaxis(shortfall, -2, -1).reshape(-1, n_days),
+    )
+    max_event = np.zeros(n_series)
+    np.maximum.at(max_event, series, volumes)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        frequency = deficit_days / n_days
+        return {
+            'frequency': frequency,
+            'longest_run': run_lengths(in_deficit).max(axis=-2, initial=0),
+            'events': events,
+            'shortfall': total_shortfall,
+            'reliability': 1 - frequency,
+            'volumetric_reliability': np.where(total_demand > 0, 1 - total_shortfall / total_demand, np.nan),
+            'resilience': np.where(deficit_days > 0, events / deficit_days, np.nan),
+            'vulnerability': np.where(events > 0, total_shortfall / events, 0.0),
+            'max_event_shortfall': max_event.reshape(lead_shape),
+        }
+
+
+def metrics_frame(metrics):
+    """Tabla (subcuenca x métrica) a partir de ``{métrica: arreglo (subcuenca,)}``."""
+    return pd.DataFrame({name: metrics[name] for name in DEFICIT_METRICS}, index=pd.Index(SUBBASINS, name='Subcuenca'))
+
+
+def batch_deficits(aggregates_list):
+    """Tablas de déficit de varios escenarios evaluados en una sola llamada.
+
+    Los escenarios se alinean en las fechas comunes; devuelve una tabla por escenario.
+    """
+    index = aggregates_list[0].subbasin_supply.index
+    for aggregates in aggregates_list[1:]:
+        index = index.intersection(aggregates.subbasin_supply.index)
+    supply = np.stack([a.subbasin_supply.reindex(index)[SUBBASINS].to_numpy() for a in aggregates_list])
+    demand = np.stack([a.subbasin_demand.reindex(index)[SUBBASINS].to_numpy() for a in aggregates_list])
+    metrics = deficit_metrics(supply, demand)
+    return [metrics_frame({name: values[i] for name, values in metrics.items()}) for i in range(len(aggregates_list))]
+
+
+def scenario_deficits(aggregates):
+    """Tabla (subcuenca x métrica) con las métricas de déficit de un escenario."""
+    return batch_deficits([aggregates])[0]
@@ -0,0 +1,64 @@
+"""Modo ensamble: las cinco réplicas (R1–R5) de una misma configuración.
+
+Las réplicas se apilan en un arreglo 3-D (réplica x tiempo x columna) y las
+bandas de incertidumbre (media, mínimo, máximo y percentiles) se calculan a lo
+largo del eje de réplicas en una sola llamada vectorizada.
+"""
+import numpy as np
+import pandas as pd
+
+from owf.aggregate import KINDS, group_sum, year_end_index
+from owf.schema import RUNS
+
+BAND_PERCENTILES = (10, 90)
+BAND_COLUMNS = ['mean', 'min', 'low', 'high', 'max']
+
+
+def replica_params(scenario_params):
+    """Parámetros de cada réplica de la configuración, en el orden de ``RUNS``."""
+    return [dict(scenario_params, run=run) for run in RUNS]
+
+
+def stack_replicas(frames):
+    """Apila DataFrames (tiempo x columna) en un arreglo (réplica x tiempo x columna).
+
+    Se usan las fechas y columnas comunes a todas las réplicas.
+    """
+    index = frames[0].index
+    columns = frames[0].columns
+    for df in frames[1:]:
+        index = index.intersection(df.index)
+        columns = columns.intersection(df.columns)
+    values = np.stack([df.reindex(index=index, columns=columns).to_numpy(dtype=float) for df in frames])
+    return values, index, columns
+
+
+def ensemble_bands(values, percentiles=BAND_PERCENTILES):
+    """Media, mínimo, percentiles y máximo a lo largo del eje de réplicas (eje 0).
+
+    Devuelve un arreglo con un eje inicial adicional en el orden de ``BAND_COLUMNS``.
+    """
+    low, high = percentiles
+    quantiles = np.nanpercentile(values, [0, low, high, 100], axis=0)
+    return np.stack([np.nanmean(values, axis=0), quantiles[0], quantiles[1], quantiles[2], quantiles[3]])
+
+
+def bands_frame(bands, index):
+    """Convierte las bandas de una serie (banda x tiempo) en un DataFrame con ``BAND_COLUMNS``."""
+    return pd.DataFrame(np.asarray(bands).T, index=index, columns=BAND_COLUMNS)
+
+
+def annual_ensemble(daily, percentiles=BAND_PERCENTILES):
+    """Bandas de los totales anuales de oferta y demanda entre réplicas.
+
+    ``daily`` son los totales diarios de cada réplica (tiempo x ``KINDS``, ver
+    ``owf.aggregate.daily_totals``). Devuelve ``{'supply': DataFrame, 'demand':
+    DataFrame}`` indexados por fin de año.
+    """
+    values, dates, columns = stack_replicas(daily)
+
+    years, year_idx = np.unique(dates.year.to_numpy(), return_inverse=True)
+    # (tiempo x réplica x tipo) -> suma por año -> (réplica x año x tipo)
+    annual = group_sum(values.transpose(1, 0, 2), year_idx, len(years)).transpose(1, 0, 2)
+    bands = ensemble_bands(annual, percentiles)
+    return {kind: bands_frame(bands[:, :, list(columns).index(kind)], year_end_index(years)) for kind in KINDS}
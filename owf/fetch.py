@@ -0,0 +1,185 @@
+"""Descarga concurrente y acotada de escenarios desde Google Drive.
+
+Las descargas y el análisis de los CSV se reparten en un ``ThreadPoolExecutor``
+con un número máximo de trabajadores. Las esperas de red siempre se solapan; el
+análisis solo corre en paralelo con el motor ``pyarrow`` de ``read_csv``, que
+libera el GIL mientras lee (con el motor ``c`` los análisis se ejecutan uno tras
+otro aunque estén en hilos distintos). Cada petición tiene su propio tiempo
+límite y se reintenta con espera exponencial ante errores transitorios. La URL
+de descarga se puede redirigir a un servidor local (``OWF_DRIVE_URL``) para
+pruebas y mediciones sin acceder a Drive.
+"""
+import http.client
+import importlib.util
+import io
+import os
+import random
+import time
+import urllib.error
+import urllib.request
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from owf import perf
+from owf.cache import SCENARIO_CACHE
+from owf.schema import SCENARIO_COLUMNS, VALUE_DTYPE
+from owf.store import read_scenario, slice_window, write_scenario
+
+DRIVE_URL = os.environ.get("OWF_DRIVE_URL", "https://docs.google.com/uc?export=download&id={file_id}")
+FETCH_MAX_WORKERS = int(os.environ.get("OWF_FETCH_WORKERS", 4))
+FETCH_TIMEOUT = float(os.environ.get("OWF_FETCH_TIMEOUT", 60))
+FETCH_RETRIES = int(os.environ.get("OWF_FETCH_RETRIES", 3))
+FETCH_BACKOFF = float(os.environ.get("OWF_FETCH_BACKOFF", 1.0))
+# pyarrow (ya instalado como dependencia de Streamlit) lee el CSV sin el GIL y con
+# varios hilos; sin él se usa el motor ``c``, que analiza un escenario a la vez.
+CSV_ENGINE = "pyarrow" if importlib.util.find_spec("pyarrow") else "c"
+
+# Códigos HTTP que se consideran transitorios y justifican un reintento.
+_RETRY_STATUS = {408, 429, 500, 502, 503, 504}
+
+FetchResult = namedtuple("FetchResult", ["file_name", "data", "error", "source"])
+
+
+class FetchError(Exception):
+    """Error al descargar o procesar un escenario."""
+
+
+def download(file_id, url_template=None, timeout=None, retries=None, backoff=None):
+    """Descarga el contenido de un archivo, reintentando con espera exponencial."""
+    url = (url_template or DRIVE_URL).format(file_id=file_id)
+    timeout = FETCH_TIMEOUT if timeout is None else timeout
+    retries = FETCH_RETRIES if retries is None else retries
+    backoff = FETCH_BACKOFF if backoff is None else backoff
+
+    for attempt in range(retries + 1):
+        try:
+            with perf.span("download"), urllib.request.urlopen(url, timeout=timeout) as response:
+                data = response.read()
+            perf.count("bytes_downloaded", len(data))
+            return data
+        except urllib.error.HTTPError as e:
+            if e.code not in _RETRY_STATUS or attempt == retries:
+                raise FetchError(f"HTTP {e.code} al descargar {url}") from e
+        except (urllib.error.URLError, http.client.HTTPException, TimeoutError, ConnectionError) as e:
+            # HTTPException incluye las respuestas truncadas (IncompleteRead).
+            if attempt == retries:
+                raise FetchError(f"No se pudo descargar {url}: {e}") from e
+        perf.count("download_retries")
+        time.sleep(backoff * (2 ** attempt) * (1 + random.random() * 0.1))
+
+
+def parse_scenario_csv(data, columns=SCENARIO_COLUMNS, dtype=VALUE_DTYPE):
+    """Convierte el contenido CSV de un escenario en un DataFrame indexado por fecha ('Date').
+
+    Solo se leen la primera columna (fechas) y las de ``columns`` (todas si es
+    ``None``), y los valores se almacenan directamente con el tipo ``dtype``.
+    """
+    with perf.span("parse.csv"):
+        header = pd.read_csv(io.BytesIO(data), nrows=0).columns
+        date_col = header[0]
+        wanted = None if columns is None else set(columns)
+        value_cols = [c for c in header[1:] if wanted is None or c in wanted]
+        df = pd.read_csv(
+            io.BytesIO(data),
+            usecols=None if len(value_cols) == len(header) - 1 else [date_col] + value_cols,
+            dtype={c: dtype for c in value_cols},
+            index_col=0,
+            engine=CSV_ENGINE,
+        )
+    # Las fechas se convierten aparte para medir su costo por separado.
+    with perf.span("parse.dates"):
+        df.index = pd.to_datetime(df.index)
+    df.index.name = 'Date'
+    perf.count("bytes_parsed", len(data))
+    perf.count("rows_parsed", len(df))
+    return df
+
+
+def _fetch_uncached(file_name, file_id, use_store=True, write_store=True, **download_options):
+    with perf.span("store.read"):
+        df = read_scenario(file_name) if use_store else None
+    if df is not None:
+        return FetchResult(file_name, df, None, "store")
+    try:
+        df = parse_scenario_csv(download(file_id, **download_options))
+    except FetchError as e:
+        return FetchResult(file_name, None, e, "download")
+    except (ValueError, pd.errors.ParserError) as e:
+        return FetchResult(file_name, None, FetchError(f"Error al procesar {file_name}: {e}"), "download")
+    with perf.span("store.write"):
+        written = use_store and write_store and write_scenario(file_name, df)
+    if written:
+        # Se vuelve a leer del almacén para que las columnas compartidas con otros
+        # escenarios ocupen memoria una sola vez.
+        stored = read_scenario(file_name)
+        if stored is not None:
+            df = stored
+    return FetchResult(file_name, df, None, "download")
+
+
+def _counted(result):
+    # Contador por origen: 'fetch.memory' y 'fetch.store' son aciertos, 'fetch.download' fallos.
+    perf.count(f"fetch.{result.source}")
+    return result
+
+
+def fetch_scenario(file_name, file_id, use_store=True, use_cache=True, window=None, write_store=True, **download_options):
+    """Devuelve un escenario desde la caché en memoria, el almacén local o, si no está, lo descarga.
+
+    Con ``use_cache`` el DataFrame devuelto es de solo lectura y se comparte entre sesiones.
+    Con ``write_store=False`` se lee del almacén pero no se guardan en él las descargas.
+    Con ``window = (primer año, último año)`` se devuelven solo las filas de esos años:
+    del almacén se leen únicamente esas filas, y el escenario completo solo se
+    descarga (y guarda) si no está en ninguna de las cachés.
+    """
+    if window is not None:
+        df = SCENARIO_CACHE.get(file_name) if use_cache else None
+        if df is not None:
+            return _counted(FetchResult(file_name, slice_window(df, window), None, "memory"))
+        with perf.span("store.read"):
+            df = read_scenario(file_name, window=window) if use_store else None
+        if df is not None:
+            return _counted(FetchResult(file_name, df, None, "store"))
+        if use_cache:
+            # La búsqueda en memoria ya se ha contado arriba.
+            result = _fetch_cached(file_name, file_id, use_store, write_store, count=False, **download_options)
+        else:
+            result = _counted(_fetch_uncached(file_name, file_id, use_store, write_store, **download_options))
+        return result if result.error is not None else result._replace(data=slice_window(result.data, window))
+
+    if not use_cache:
+        return _counted(_fetch_uncached(file_name, file_id, use_store, write_store, **download_options))
+    return _fetch_cached(file_name, file_id, use_store, write_store, **download_options)
+
+
+def _fetch_cached(file_name, file_id, use_store, write_store, count=True, **download_options):
+    """Obtiene el escenario completo a través de ``SCENARIO_CACHE`` (una sola carga por clave)."""
+    results = []
+
+    def load():
+        results.append(_fetch_uncached(file_name, file_id, use_store, write_store, **download_options))
+        return results[-1].data
+
+    df, hit = SCENARIO_CACHE.get_or_load(file_name, load, count=count)
+    if hit:
+        return _counted(FetchResult(file_name, df, None, "memory"))
+    return _counted(results[-1]._replace(data=df))
+
+
+def fetch_scenarios(items, max_workers=None, **download_options):
+    """Obtiene en paralelo una lista de pares ``(file_name, file_id)``, conservando el orden.
+
+    Las descargas se solapan; el análisis de los CSV solo en paralelo con ``CSV_ENGINE = 'pyarrow'``.
+    """
+    items = list(items)
+    if not items:
+        return []
+    # Un mismo archivo solicitado varias veces se descarga una sola vez.
+    unique = dict(items)
+    workers = max(1, min(max_workers or FETCH_MAX_WORKERS, len(unique)))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="owf-fetch") as pool:
+        futures = {name: pool.submit(perf.bind(fetch_scenario), name, file_id, **download_options)
+                   for name, file_id in unique.items()}
+        return [futures[name].result() for name, _ in items]
@@ -0,0 +1,142 @@
+"""Constructores de las figuras Plotly de la comparación, sin dependencia de Streamlit.
+
+Cada función devuelve un ``go.Figure`` (o ``None`` si no hay datos que dibujar),
+de modo que las mismas figuras se usan en la aplicación y en los informes
+generados fuera de línea (``owf.report``).
+"""
+import numpy as np
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+
+from owf.aggregate import MONTHS
+from owf.downsample import downsample_series
+from owf.maps import FEATURE_ID, NAME_PROPERTY
+
+SCENARIO_NAMES = ['Escenario 1', 'Escenario 2']
+
+
+def _rgba(hex_color, alpha):
+    """Convierte un color '#rrggbb' en 'rgba(r, g, b, alpha)'."""
+    r, g, b = (int(hex_color[i:i + 2], 16) for i in (1, 3, 5))
+    return f"rgba({r}, {g}, {b}, {alpha})"
+
+
+def line_comparison(s1_data, s2_data, title, yaxis_title, bands=None):
+    """Gráfico de líneas comparativo.
+
+    Con ``bands`` (par de DataFrames de ``owf.ensemble``) se añaden, para cada
+    escenario, la banda mínimo–máximo y la banda de percentiles entre réplicas.
+    """
+    fig = go.Figure()
+    colors = px.colors.qualitative.Plotly
+    for i, (data, name) in enumerate(zip([s1_data, s2_data], SCENARIO_NAMES)):
+        band = bands[i] if bands is not None else None
+        if band is not None and not band.empty:
+            years = band.index.year
+            for low, high, opacity in [('min', 'max', 0.12), ('low', 'high', 0.3)]:
+                fig.add_trace(go.Scatter(x=years, y=band[high], mode='lines', line_width=0, legendgroup=name,
+                                         showlegend=False, hoverinfo='skip'))
+                fig.add_trace(go.Scatter(x=years, y=band[low], mode='lines', line_width=0, legendgroup=name,
+                                         showlegend=False, hoverinfo='skip', fill='tonexty',
+                                         fillcolor=_rgba(colors[i], opacity)))
+        if not data.empty:
+            fig.add_trace(go.Scatter(x=data.index.year, y=data.values, mode='lines+markers', name=name,
+                                     legendgroup=name, line_color=colors[i]))
+    fig.update_layout(title=title, yaxis_title=yaxis_title, legend_orientation="h", legend_y=1.15)
+    return fig
+
+
+def boxplot_comparison(s1_box, s2_box, title, yaxis_title):
+    """Gráfico de cajas comparativo a partir de estadísticos mensuales precalculados.
+
+    Solo se envían al navegador los cuartiles, bigotes y valores atípicos de cada
+    mes, no la serie diaria completa. Si los bigotes son el mínimo y el máximo
+    (cajas del cubo), se indica en el título.
+    """
+    if s1_box.stats.empty and s2_box.stats.empty:
+        return None
+    if 'minmax' in (s1_box.whiskers, s2_box.whiskers):
+        title = f"{title} (bigotes: mínimo y máximo)"
+    fig = go.Figure()
+    colors = px.colors.qualitative.Plotly
+    for (box, name), color in zip(zip([s1_box, s2_box], SCENARIO_NAMES), colors):
+        if box.stats.empty:
+            continue
+        stats = box.stats
+        fig.add_trace(go.Box(x=stats['Month'], q1=stats['q1'], median=stats['median'], q3=stats['q3'],
+                             lowerfence=stats['lowerfence'], upperfence=stats['upperfence'],
+                             name=name, legendgroup=name, offsetgroup=name, marker_color=color))
+        if not box.outliers.empty:
+            fig.add_trace(go.Scatter(x=box.outliers['Month'], y=box.outliers['Total'], mode='markers',
+                                     name=name, legendgroup=name, offsetgroup=name, showlegend=False,
+                                     marker=dict(color=color, size=4)))
+    fig.update_layout(title=title, yaxis_title=yaxis_title, boxmode='group', scattermode='group',
+                      legend_orientation="h", legend_y=1.15)
+    # CORRECCIÓN: Asegurar que todos los meses se muestren en orden
+    fig.update_xaxes(categoryorder='array', categoryarray=MONTHS)
+    return fig
+
+
+def daily_comparison(s1_data, s2_data, title, yaxis_title):
+    """Series diarias con trazos WebGL, reducidas con LTTB para aligerar el envío."""
+    fig = go.Figure()
+    for data, name in zip([s1_data, s2_data], SCENARIO_NAMES):
+        if data.empty:
+            continue
+        reduced = downsample_series(data)
+        fig.add_trace(go.Scattergl(x=reduced.index, y=reduced.values, mode='lines', name=name))
+    fig.update_layout(title=title, yaxis_title=yaxis_title, legend_orientation="h", legend_y=1.15)
+    return fig
+
+
+def stress_maps(s1_ratios, s2_ratios, basins):
+    """Mapas coropléticos de estrés hídrico (demanda/oferta) por subcuenca, uno por escenario."""
+    names = {f['properties'][FEATURE_ID]: f['properties'].get(NAME_PROPERTY) for f in basins['features']}
+    zmax = max(1.0, float(np.nanmax(np.concatenate([s1_ratios.values, s2_ratios.values]))))
+    figures = []
+    for ratios, name in zip([s1_ratios, s2_ratios], SCENARIO_NAMES):
+        fig = go.Figure(go.Choropleth(
+            geojson=basins, featureidkey=f"properties.{FEATURE_ID}", locations=ratios.index, z=ratios.values,
+            text=[names.get(key, key) for key in ratios.index], hovertemplate="%{text}<br>Demanda/Oferta: %{z:.2f}<extra></extra>",
+            zmin=0, zmax=zmax, colorscale='RdYlBu_r', marker_line_width=0.5, colorbar_title="Demanda/Oferta",
+        ))
+        fig.update_geos(fitbounds="locations", visible=False)
+        fig.update_layout(title=f"Estrés Hídrico por Subcuenca - {name}", margin=dict(l=0, r=0, t=40, b=0))
+        figures.append(fig)
+    return figures
+
+
+def deficit_comparison(s1_table, s2_table):
+    """Confiabilidad volumétrica por subcuenca de ambos escenarios (tablas de ``owf.deficit``)."""
+    fig = go.Figure()
+    for table, name in zip([s1_table, s2_table], SCENARIO_NAMES):
+        fig.add_trace(go.Bar(x=table.index, y=table['volumetric_reliability'], name=name))
+    fig.update_layout(title="Confiabilidad Volumétrica por Subcuenca", yaxis_title="Confiabilidad (0-1)",
+                      yaxis_range=[0, 1], barmode='group', legend_orientation="h", legend_y=1.15)
+    return fig
+
+
+def composition_comparison(s1_data, s2_data):
+    """Barras apiladas con la composición de la demanda de ambos escenarios."""
+    if s1_data.empty and s2_data.empty:
+        return None
+    combined_df = pd.concat([s1_data.assign(Escenario=SCENARIO_NAMES[0]), s2_data.assign(Escenario=SCENARIO_NAMES[1])])
+    fig = px.bar(combined_df, x='Escenario', y='Porcentaje', color='Componente',
+                 title='Composición Anual de Demanda (sin componente Ambiental)', barmode='stack')
+    fig.update_layout(yaxis_title='Porcentaje (%)', xaxis_title=None, legend_title='Componente')
+    return fig
+
+
+def sweep_figure(table, metric):
+    """Resultado de un barrido: líneas para un eje, mapa de calor para dos."""
+    fig = go.Figure()
+    if isinstance(table, pd.Series):
+        fig.add_trace(go.Scatter(x=[str(v) for v in table.index], y=table.values, mode='lines+markers', name=metric))
+        fig.update_layout(xaxis_title=table.index.name, yaxis_title=metric)
+    else:
+        fig.add_trace(go.Heatmap(z=table.values, x=[str(v) for v in table.columns], y=[str(v) for v in table.index],
+                                 colorscale='RdYlBu_r', colorbar_title=metric))
+        fig.update_layout(xaxis_title=table.columns.name, yaxis_title=table.index.name)
+    fig.update_layout(title=f"Barrido de parámetros: {metric}")
+    return fig
@@ -0,0 +1,182 @@
+"""Índice compacto del manifiesto de escenarios.
+
+El ``manifest.json`` asocia 26.880 nombres de archivo con IDs de Google Drive.
+Este módulo lo compila a un arreglo denso de IDs (``S33``) con la forma de la
+malla de escenarios (``GRID_SHAPE``), de modo que la búsqueda es una
+indexación por tupla de enteros y la disponibilidad de cada combinación de
+parámetros se obtiene con operaciones sobre la máscara ``available``.
+
+El índice compilado se guarda junto al JSON (``manifest_index.npz``) y se
+regenera automáticamente cuando el JSON cambia. También puede compilarse a mano::
+
+    python -m owf.manifest soporte/manifest.json
+"""
+import argparse
+import json
+import os
+import re
+import sys
+
+import numpy as np
+
+from owf.schema import GRID_SHAPE, POLICIES, SCENARIO_AXES, iter_grid, scenario_file_name, scenario_index
+
+MANIFEST_PATH = os.path.join("soporte", "manifest.json")
+INDEX_FORMAT_VERSION = 1
+
+_FILE_NAME_RE = re.compile(r"OWF_(?P<policy>\w+?)_(?P<run>R\d+)_DT(?P<tempChange>-?\d+)_DP(?P<precipChange>\d+)"
+                           r"_FW(?P<popYear>\d+)_Irr(?P<cropYear>\d+)_Liv(?P<livestockYear>\d+)\.csv")
+_POLICY_LABELS = {code: label for label, code in POLICIES.items()}
+
+
+def parse_file_name(file_name):
+    """Convierte un nombre de archivo del manifiesto en parámetros de escenario, o ``None``."""
+    match = _FILE_NAME_RE.fullmatch(file_name)
+    if not match or match['policy'] not in _POLICY_LABELS:
+        return None
+    return {
+        'policy': _POLICY_LABELS[match['policy']],
+        'run': match['run'],
+        'tempChange': int(match['tempChange']),
+        'precipChange': int(match['precipChange']) - 100,
+        'popYear': int(match['popYear']),
+        'cropYear': int(match['cropYear']),
+        'livestockYear': int(match['livestockYear']),
+    }
+
+
+def _index_path(manifest_path):
+    return os.path.join(os.path.dirname(manifest_path), "manifest_index.npz")
+
+
+def _source_signature(manifest_path):
+    stat = os.stat(manifest_path)
+    return np.array([stat.st_size, stat.st_mtime_ns], dtype=np.int64)
+
+
+class ManifestIndex:
+    """Índice del manifiesto con búsqueda O(1) por parámetros de escenario."""
+
+    def __init__(self, ids, extra=None):
+        self.ids = ids
+        self.available = ids != b""
+        # Entradas que no encajan en la malla (se conservan para no perder información).
+        self.extra = extra or {}
+
+    @classmethod
+    def from_manifest(cls, data_manifest):
+        """Compila el índice a partir del diccionario ``{nombre_archivo: id}``."""
+        width = max((len(file_id) for file_id in data_manifest.values()), default=1)
+        ids = np.zeros(GRID_SHAPE, dtype=f"S{width}")
+        extra = {}
+        for file_name, file_id in data_manifest.items():
+            params = parse_file_name(file_name)
+            try:
+                ids[scenario_index(params)] = file_id.encode("ascii")
+            except (TypeError, ValueError):
+                extra[file_name] = file_id
+        return cls(ids, extra)
+
+    def lookup(self, scenario_params):
+        """Devuelve el ID de Drive del escenario, o ``None`` si no existe."""
+        try:
+            file_id = self.ids[scenario_index(scenario_params)]
+        except (KeyError, ValueError):
+            return self.extra.get(scenario_file_name(scenario_params))
+        return file_id.decode("ascii") if file_id else None
+
+    def get(self, file_name, default=None):
+        """Búsqueda por nombre de archivo, compatible con el diccionario original."""
+        params = parse_file_name(file_name)
+        file_id = self.lookup(params) if params else self.extra.get(file_name)
+        return file_id if file_id is not None else default
+
+    def __contains__(self, file_name):
+        return self.get(file_name) is not None
+
+    def __getitem__(self, file_name):
+        file_id = self.get(file_name)
+        if file_id is None:
+            raise KeyError(file_name)
+        return file_id
+
+    def __len__(self):
+        return int(self.available.sum()) + len(self.extra)
+
+    def items(self):
+        """Recorre ``(índice, parámetros, id)`` para cada escenario disponible en la malla."""
+        for index, params in iter_grid():
+            if self.available[index]:
+                yield index, params, self.ids[index].decode("ascii")
+
+    def available_values(self, axis_name, fixed_params=None):
+        """Valores del eje ``axis_name`` con algún escenario disponible, dados los ejes anteriores fijados.
+
+        Solo se fijan los ejes que preceden a ``axis_name`` en ``SCENARIO_AXES`` y que
+        aparecen en ``fixed_params``; los demás quedan libres.
+        """
+        fixed_params = fixed_params or {}
+        names = [name for name, _ in SCENARIO_AXES]
+        axis = names.index(axis_name)
+        selector = []
+        for name, values in SCENARIO_AXES[:axis]:
+            value = fixed_params.get(name)
+            selector.append(values.index(value) if value in values else slice(None))
+        mask = self.available[tuple(selector)]
+        # Se reducen los ejes libres anteriores y todos los posteriores.
+        mask = np.moveaxis(mask, sum(isinstance(s, slice) for s in selector), 0)
+        mask = mask.reshape(mask.shape[0], -1).any(axis=1)
+        return [value for value, ok in zip(SCENARIO_AXES[axis][1], mask) if ok]
+
+    def save(self, path, source_signature=None):
+        """Guarda el índice compilado en ``path`` (``.npz`` sin comprimir, carga rápida)."""
+        tmp_path = f"{path}.tmp.npz"
+        np.savez(tmp_path, version=INDEX_FORMAT_VERSION, ids=self.ids,
+                 extra=json.dumps(self.extra), source=np.asarray(source_signature if source_signature is not None else [], dtype=np.int64))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path, source_signature=None):
+        """Carga un índice compilado. Lanza ``ValueError`` si está desactualizado respecto al JSON."""
+        with np.load(path) as data:
+            if int(data['version']) != INDEX_FORMAT_VERSION or data['ids'].shape != GRID_SHAPE:
+                raise ValueError("índice de manifiesto incompatible")
+            if source_signature is not None and not np.array_equal(data['source'], source_signature):
+                raise ValueError("índice de manifiesto desactualizado")
+            return cls(data['ids'], json.loads(str(data['extra'])))
+
+
+def load_manifest_index(manifest_path=MANIFEST_PATH, index_path=None):
+    """Carga el índice compilado, recompilándolo desde el JSON si falta o está desactualizado."""
+    index_path = index_path or _index_path(manifest_path)
+    signature = _source_signature(manifest_path)
+    try:
+        return ManifestIndex.load(index_path, signature)
+    except (OSError, ValueError, KeyError):
+        pass
+
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        index = ManifestIndex.from_manifest(json.load(f))
+    try:
+        index.save(index_path, signature)
+    except OSError:
+        pass
+    return index
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compila el manifiesto de escenarios OWF a un índice compacto.")
+    parser.add_argument("manifest", nargs="?", default=MANIFEST_PATH)
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args(argv)
+
+    output = args.output or _index_path(args.manifest)
+    with open(args.manifest, 'r', encoding='utf-8') as f:
+        index = ManifestIndex.from_manifest(json.load(f))
+    index.save(output, _source_signature(args.manifest))
+    print(f"Índice guardado en {output}: {len(index)} escenarios ({len(index.extra)} fuera de la malla).")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,147 @@
+"""Mapas coropléticos de estrés hídrico por subcuenca.
+
+La geometría de ``soporte/cuencas/cuencas.geojson`` es muy detallada (unos
+50.000 vértices). Se simplifica una sola vez (Douglas-Peucker) en varios
+niveles de precisión, se cuantizan las coordenadas a un número fijo de
+decimales y se conservan solo las propiedades necesarias. Cada nivel se guarda
+junto al archivo original y se regenera si este cambia.
+
+Las subcuencas se identifican por la propiedad ``cuencas`` (p. ej.
+``'Garagoa_cmd'``), que coincide con el sufijo de las columnas de los CSV.
+"""
+import functools
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from owf.schema import SUBBASINS
+
+BASINS_PATH = os.path.join("soporte", "cuencas", "cuencas.geojson")
+FEATURE_ID = 'cuencas'
+NAME_PROPERTY = 'NOM_SZH'
+
+# Nivel de detalle -> (tolerancia de simplificación en grados, decimales conservados)
+DETAIL_LEVELS = {
+    'alta': (0.0005, 4),
+    'media': (0.002, 3),
+    'baja': (0.01, 2),
+}
+
+
+def subbasin_key(subbasin):
+    """Identificador de la subcuenca en el GeoJSON (``'Garagoa'`` -> ``'Garagoa_cmd'``)."""
+    return f"{subbasin}_cmd"
+
+
+def simplify_ring(coords, tolerance):
+    """Simplifica un anillo con Douglas-Peucker, conservando al menos 4 puntos (anillo cerrado)."""
+    points = np.asarray(coords, dtype=float)[:, :2]
+    n = len(points)
+    if n <= 4:
+        return points
+    keep = np.zeros(n, dtype=bool)
+    keep[[0, -1]] = True
+    stack = [(0, n - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end <= start + 1:
+            continue
+        a, b = points[start], points[end]
+        segment = points[start + 1:end]
+        ab = b - a
+        length = np.hypot(*ab)
+        if length == 0:
+            distances = np.hypot(*(segment - a).T)
+        else:
+            distances = np.abs(ab[0] * (segment[:, 1] - a[1]) - ab[1] * (segment[:, 0] - a[0])) / length
+        i = int(np.argmax(distances))
+        if distances[i] > tolerance:
+            split = start + 1 + i
+            keep[split] = True
+            stack.extend([(start, split), (split, end)])
+    if keep.sum() < 4:
+        keep[np.linspace(0, n - 1, 4).astype(int)] = True
+    return points[keep]
+
+
+def quantize_ring(points, decimals):
+    """Redondea las coordenadas y elimina puntos consecutivos repetidos."""
+    rounded = np.round(points, decimals)
+    changed = np.concatenate([[True], np.any(np.diff(rounded, axis=0) != 0, axis=1)])
+    ring = rounded[changed]
+    if len(ring) < 4:
+        ring = rounded
+    return ring
+
+
+def _simplify_geometry(geometry, tolerance, decimals):
+    def ring(coords):
+        return quantize_ring(simplify_ring(coords, tolerance), decimals).tolist()
+
+    if geometry['type'] == 'Polygon':
+        coordinates = [ring(r) for r in geometry['coordinates']]
+    elif geometry['type'] == 'MultiPolygon':
+        coordinates = [[ring(r) for r in polygon] for polygon in geometry['coordinates']]
+    else:
+        return geometry
+    return {'type': geometry['type'], 'coordinates': coordinates}
+
+
+def simplify_basins(geojson, level):
+    """Versión simplificada y cuantizada del GeoJSON, con solo las propiedades de identificación."""
+    tolerance, decimals = DETAIL_LEVELS[level]
+    features = []
+    for feature in geojson['features']:
+        properties = feature['properties']
+        features.append({
+            'type': 'Feature',
+            'properties': {FEATURE_ID: properties[FEATURE_ID], NAME_PROPERTY: properties.get(NAME_PROPERTY)},
+            'geometry': _simplify_geometry(feature['geometry'], tolerance, decimals),
+        })
+    return {'type': 'FeatureCollection', 'features': features}
+
+
+def _cache_path(path, level):
+    root, ext = os.path.splitext(path)
+    return f"{root}.{level}{ext}"
+
+
+@functools.lru_cache(maxsize=None)
+def load_basins(level='media', path=BASINS_PATH):
+    """Carga las subcuencas en el nivel de detalle dado, simplificándolas solo la primera vez."""
+    stat = os.stat(path)
+    signature = [stat.st_size, stat.st_mtime_ns]
+    cache_path = _cache_path(path, level)
+    try:
+        with open(cache_path, 'r', encoding='utf-8') as f:
+            cached = json.load(f)
+        if cached.get('owf_source') == signature:
+            return cached
+    except (OSError, ValueError):
+        pass
+
+    with open(path, 'r', encoding='utf-8') as f:
+        simplified = simplify_basins(json.load(f), level)
+    simplified['owf_source'] = signature
+    try:
+        with open(cache_path, 'w', encoding='utf-8') as f:
+            json.dump(simplified, f, separators=(',', ':'))
+    except OSError:
+        pass
+    return simplified
+
+
+def stress_ratios(subbasin_supply, subbasin_demand):
+    """Relación demanda/oferta total por subcuenca, calculada de forma vectorizada.
+
+    Recibe DataFrames (tiempo x subcuenca) —diarios o anuales— y devuelve una
+    serie indexada por el identificador del GeoJSON. Las subcuencas sin oferta
+    quedan en NaN.
+    """
+    supply = subbasin_supply[SUBBASINS].to_numpy().sum(axis=0)
+    demand = subbasin_demand[SUBBASINS].to_numpy().sum(axis=0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratios = np.where(supply > 0, demand / supply, np.nan)
+    return pd.Series(ratios, index=[subbasin_key(s) for s in SUBBASINS], name='Demanda/Oferta')
@@ -0,0 +1,135 @@
+"""Instrumentación de las rutas críticas: intervalos de tiempo, contadores y registros JSON.
+
+Una *traza* (``trace``) agrupa lo ocurrido durante una operación completa (una
+ejecución de la aplicación, un informe). Dentro de ella, ``span`` mide la
+duración de cada etapa (descarga, análisis del CSV, fechas, agregación,
+figuras, serialización) y ``count`` acumula contadores (aciertos y fallos de
+caché, bytes descargados y analizados). La traza activa vive en una
+``ContextVar``: cada sesión de Streamlit tiene la suya, y ``bind`` la propaga
+a los hilos de los grupos de trabajadores.
+
+Al cerrar una traza se emite un registro JSON por el logger ``owf.perf``. Con
+``OWF_PERF_LOG`` (ruta de archivo, o ``-`` para la salida de errores) se
+escriben esos registros, una línea por traza, para agregarlos entre usuarios.
+Fuera de una traza, ``span`` y ``count`` no hacen nada.
+"""
+import contextvars
+import functools
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+PERF_LOG = os.environ.get("OWF_PERF_LOG")
+
+logger = logging.getLogger("owf.perf")
+
+_current = contextvars.ContextVar("owf_perf_trace", default=None)
+
+
+def _configure_logger():
+    if not PERF_LOG or logger.handlers:
+        return
+    handler = logging.StreamHandler(sys.stderr) if PERF_LOG == "-" else logging.FileHandler(PERF_LOG, encoding="utf-8")
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+
+_configure_logger()
+
+
+class Trace:
+    """Intervalos y contadores de una operación; seguro para varios hilos."""
+
+    def __init__(self, name, attrs=None):
+        self.name = name
+        self.attrs = dict(attrs or {})
+        self.started_at = datetime.now(timezone.utc)
+        self._start = time.perf_counter()
+        self.duration = None
+        self.spans = []      # (nombre, inicio relativo en s, duración en s)
+        self.counters = {}
+        self._lock = threading.Lock()
+
+    def add_span(self, name, start, duration):
+        with self._lock:
+            self.spans.append((name, start - self._start, duration))
+
+    def add_count(self, name, value):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def finish(self):
+        self.duration = time.perf_counter() - self._start
+
+    def span_summary(self):
+        """``{nombre: {'count', 'total_ms', 'max_ms'}}``, en el orden en que empezó cada etapa."""
+        summary = {}
+        with self._lock:
+            spans = sorted(self.spans, key=lambda item: item[1])
+        for name, _, duration in spans:
+            entry = summary.setdefault(name, {'count': 0, 'total_ms': 0.0, 'max_ms': 0.0})
+            entry['count'] += 1
+            entry['total_ms'] += duration * 1000
+            entry['max_ms'] = max(entry['max_ms'], duration * 1000)
+        return summary
+
+    def to_record(self):
+        """Registro JSON serializable de la traza."""
+        with self._lock:
+            counters = dict(self.counters)
+        return {
+            'event': 'owf.trace',
+            'name': self.name,
+            'ts': self.started_at.isoformat(),
+            'duration_ms': round((self.duration or 0) * 1000, 3),
+            'attrs': self.attrs,
+            'spans': {name: {key: round(value, 3) for key, value in entry.items()}
+                      for name, entry in self.span_summary().items()},
+            'counters': counters,
+        }
+
+
+@contextmanager
+def trace(name, **attrs):
+    """Abre una traza; al cerrarla se emite su registro JSON."""
+    active = Trace(name, attrs)
+    token = _current.set(active)
+    try:
+        yield active
+    finally:
+        _current.reset(token)
+        active.finish()
+        logger.info(json.dumps(active.to_record(), ensure_ascii=False, default=str))
+
+
+@contextmanager
+def span(name):
+    """Mide la duración de una etapa dentro de la traza activa."""
+    active = _current.get()
+    if active is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        active.add_span(name, start, time.perf_counter() - start)
+
+
+def count(name, value=1):
+    """Suma ``value`` al contador ``name`` de la traza activa."""
+    active = _current.get()
+    if active is not None:
+        active.add_count(name, value)
+
+
+def bind(func):
+    """Devuelve ``func`` ligada al contexto actual, para ejecutarla en otro hilo con la misma traza."""
+    return functools.partial(contextvars.copy_context().run, func)
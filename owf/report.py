@@ -0,0 +1,185 @@
+"""Generación por lotes de informes de comparación, sin Streamlit.
+
+Recibe una lista de pares de escenarios (archivo JSON con pares de nombres de
+archivo) o una consulta sobre la malla (un escenario base comparado con cada
+combinación al variar uno o dos ejes). Cada comparación se carga, agrega y
+dibuja en un proceso de un ``ProcessPoolExecutor``; se escribe un HTML
+autónomo por par y una tabla resumen (``resumen.csv``) con todos los pares.
+
+Uso::
+
+    python -m owf.report --pairs pares.json --output-dir reportes --workers 4
+    python -m owf.report --base OWF_FCFS_R1_DT2_DP100_FW2030_Irr2022_Liv2030.csv --vary tempChange precipChange
+"""
+import argparse
+import functools
+import html
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+from owf import perf
+from owf.compare import build_comparison, comparison_sections, summary_row
+from owf.cube import CUBE_PATH, load_cube
+from owf.manifest import MANIFEST_PATH, load_manifest_index, parse_file_name
+from owf.schema import SCENARIO_AXES, scenario_file_name
+from owf.sweep import sweep_points
+
+REPORT_DIR = "reportes"
+SUMMARY_FILE = "resumen.csv"
+
+
+@functools.lru_cache(maxsize=None)
+def _process_resources(manifest_path, cube_path):
+    # Se cargan una vez por proceso trabajador.
+    return load_manifest_index(manifest_path), load_cube(cube_path) if cube_path else None
+
+
+def report_html(title, sections, include_plotlyjs='cdn'):
+    """Documento HTML autónomo con las secciones de una comparación."""
+    parts = [f"<!DOCTYPE html><html><head><meta charset='utf-8'><title>{html.escape(title)}</title></head><body>",
+             f"<h1>{html.escape(title)}</h1>"]
+    for section in sections:
+        parts.append(f"<h2>{html.escape(section.title)}</h2>")
+        for fig in section.figures:
+            if fig is None:
+                parts.append("<p>No hay datos para este gráfico.</p>")
+                continue
+            parts.append(fig.to_html(full_html=False, include_plotlyjs=include_plotlyjs))
+            # La biblioteca se incluye una sola vez por documento.
+            include_plotlyjs = False
+        for name, table in section.tables:
+            parts.append(f"<h3>{html.escape(name)}</h3>")
+            parts.append(table.to_html(float_format=lambda value: f"{value:.4g}"))
+    parts.append("</body></html>")
+    return "\n".join(parts)
+
+
+def pair_stem(s1_params, s2_params):
+    """Nombre base de los archivos de un par de escenarios."""
+    return f"{scenario_file_name(s1_params)[:-len('.csv')]}__vs__{scenario_file_name(s2_params)[:-len('.csv')]}"
+
+
+def report_pair(s1_params, s2_params, manifest_path=MANIFEST_PATH, cube_path=CUBE_PATH, output_dir=REPORT_DIR,
+                write_html=True, daily_detail=False, ensemble=False, map_detail='media', include_plotlyjs='cdn',
+                window=None):
+    """Genera el informe de un par en el proceso actual y devuelve su fila de resumen.
+
+    Cada informe es una traza de ``owf.perf`` (se registra en ``OWF_PERF_LOG``).
+    """
+    manifest_index, cube = _process_resources(manifest_path, cube_path)
+    row = {'Escenario 1': scenario_file_name(s1_params), 'Escenario 2': scenario_file_name(s2_params)}
+    with perf.trace("report", scenarios=[row['Escenario 1'], row['Escenario 2']], window=window):
+        comparison, errors = build_comparison(s1_params, s2_params, manifest_index, cube, daily_detail, ensemble, window)
+        if comparison is None:
+            return {**row, 'Error': "; ".join(errors)}
+        if write_html:
+            path = os.path.join(output_dir, f"{pair_stem(s1_params, s2_params)}.html")
+            sections = comparison_sections(comparison, map_detail)
+            with perf.span("report.html"):
+                document = report_html(f"{row['Escenario 1']} vs {row['Escenario 2']}", sections, include_plotlyjs)
+                with open(path, "w", encoding="utf-8") as f:
+                    f.write(document)
+            row['Informe'] = os.path.basename(path)
+        return {**row, **summary_row(comparison), 'Error': "; ".join(errors) or None}
+
+
+def run_reports(pairs, workers=None, progress=None, **options):
+    """Genera los informes de ``pairs`` (lista de pares de parámetros) en un grupo de procesos.
+
+    Devuelve la tabla resumen en el orden de ``pairs``.
+    """
+    rows = [None] * len(pairs)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(report_pair, s1, s2, **options): i for i, (s1, s2) in enumerate(pairs)}
+        for done, future in enumerate(as_completed(futures), start=1):
+            i = futures[future]
+            try:
+                rows[i] = future.result()
+            except Exception as e:
+                # Un par que falla (o un trabajador que muere) no descarta el resto del lote.
+                s1, s2 = pairs[i]
+                rows[i] = {'Escenario 1': scenario_file_name(s1), 'Escenario 2': scenario_file_name(s2),
+                           'Error': f"{type(e).__name__}: {e}"}
+            if progress:
+                progress(done, len(pairs))
+    return pd.DataFrame(rows)
+
+
+def scenario_params(file_name):
+    """Parámetros de un nombre de archivo de escenario; ``ValueError`` si no es válido."""
+    params = parse_file_name(file_name)
+    if params is None:
+        raise ValueError(f"Nombre de escenario no válido: {file_name}")
+    return params
+
+
+def read_pairs(path):
+    """Lee un archivo JSON con una lista de pares ``[archivo_1, archivo_2]``."""
+    with open(path, "r", encoding="utf-8") as f:
+        return [(scenario_params(first), scenario_params(second)) for first, second in json.load(f)]
+
+
+def grid_pairs(manifest_index, base_params, axes):
+    """Pares (base, punto) para cada combinación disponible al variar ``axes`` desde la base."""
+    return [(base_params, point.params) for point in sweep_points(manifest_index, base_params, axes)
+            if point.params != base_params]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Genera informes HTML y tablas resumen de comparaciones de escenarios OWF.")
+    query = parser.add_mutually_exclusive_group(required=True)
+    query.add_argument("--pairs", help="Archivo JSON con una lista de pares de nombres de archivo.")
+    query.add_argument("--base", help="Escenario base (nombre de archivo) para una consulta sobre la malla.")
+    parser.add_argument("--vary", nargs="+", choices=[name for name, _ in SCENARIO_AXES], default=[],
+                        help="Ejes a variar desde la base (con --base).")
+    parser.add_argument("--manifest", default=MANIFEST_PATH)
+    parser.add_argument("--cube", default=CUBE_PATH, help="Cubo de agregados; cadena vacía para no usarlo.")
+    parser.add_argument("--output-dir", default=REPORT_DIR)
+    parser.add_argument("--format", choices=["html", "table"], default="html",
+                        help="'html' escribe un informe por par además del resumen; 'table' solo el resumen.")
+    parser.add_argument("--workers", type=int, default=None, help="Procesos simultáneos.")
+    parser.add_argument("--daily-detail", action="store_true", help="Usa siempre los datos completos, no el cubo.")
+    parser.add_argument("--ensemble", action="store_true", help="Incluye las bandas del ensamble de réplicas.")
+    parser.add_argument("--years", nargs=2, type=int, metavar=("PRIMERO", "ULTIMO"),
+                        help="Limita la comparación a una ventana de años (inclusiva).")
+    parser.add_argument("--map-detail", choices=["baja", "media", "alta"], default="media")
+    parser.add_argument("--inline-plotlyjs", action="store_true", help="Incluye plotly.js en cada HTML (sin conexión).")
+    args = parser.parse_args(argv)
+
+    if args.base and not args.vary:
+        parser.error("--base requiere --vary")
+    try:
+        if args.pairs:
+            pairs = read_pairs(args.pairs)
+        else:
+            pairs = grid_pairs(load_manifest_index(args.manifest), scenario_params(args.base), args.vary)
+    except ValueError as e:
+        parser.error(str(e))
+    if not pairs:
+        print("No hay pares de escenarios para procesar.", file=sys.stderr)
+        return 1
+
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    def report(done, total):
+        print(f"{done}/{total} comparaciones procesadas", file=sys.stderr)
+
+    summary = run_reports(
+        pairs, args.workers, progress=report, manifest_path=args.manifest, cube_path=args.cube,
+        output_dir=args.output_dir, write_html=args.format == "html", daily_detail=args.daily_detail,
+        ensemble=args.ensemble, map_detail=args.map_detail, window=tuple(args.years) if args.years else None,
+        include_plotlyjs=True if args.inline_plotlyjs else 'cdn',
+    )
+    summary_path = os.path.join(args.output_dir, SUMMARY_FILE)
+    summary.to_csv(summary_path, index=False)
+    failed = summary['Error'].notna().sum()
+    print(f"Resumen guardado en {summary_path}: {len(summary) - failed}/{len(summary)} comparaciones generadas.")
+    return 0 if failed < len(summary) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
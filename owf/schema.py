@@ -0,0 +1,69 @@
+"""Esquema de los datos OWF: columnas de los CSV y ejes de la malla de escenarios."""
+import itertools
+
+# --- Definición de Columnas (Extraído de visualizer.html) ---
+OFERTA_AGUA_COLS = ["To_downstream_from_Casanare_cmd", "To_downstream_from_CravoSur_cmd", "To_downstream_from_Cumaral_cmd", "To_downstream_from_Cusiana_cmd", "To_downstream_from_Dir_btw_ca_or_cmd", "To_downstream_from_Dir_btw_cu_ca_cmd", "To_downstream_from_Dir_btw_cu_cs_cmd", "To_downstream_from_Dir_btw_gb_yu_cmd", "To_downstream_from_Dir_btw_hu_up_cmd", "To_downstream_from_Dir_btw_p_ca_cmd", "To_downstream_from_Garagoa_cmd", "To_downstream_from_Guacavia_cmd", "To_downstream_from_Guanapalo_cmd", "To_downstream_from_Guatiquia_cmd", "To_downstream_from_Guavio_cmd", "To_downstream_from_Guayuriba_cmd", "To_downstream_from_Humea_cmd", "To_downstream_from_Lago_de_tota_cmd", "To_downstream_from_Lengupa_cmd", "To_downstream_from_Manacacias_cmd", "To_downstream_from_Melua_cmd", "To_downstream_from_Metica_cmd", "To_downstream_from_Negro_cmd", "To_downstream_from_Pauto_cmd", "To_downstream_from_Tua_cmd", "To_downstream_from_Upia_cmd", "To_downstream_from_Yucao_cmd"]
+DEMANDA_AGUA_COLS = ["Denv_Casanare_cmd", "Denv_CravoSur_cmd", "Denv_Cumaral_cmd", "Denv_Cusiana_cmd", "Denv_Dir_btw_ca_or_cmd", "Denv_Dir_btw_cu_ca_cmd", "Denv_Dir_btw_cu_cs_cmd", "Denv_Dir_btw_gb_yu_cmd", "Denv_Dir_btw_hu_up_cmd", "Denv_Dir_btw_p_ca_cmd", "Denv_Garagoa_cmd", "Denv_Guacavia_cmd", "Denv_Guanapalo_cmd", "Denv_Guatiquia_cmd", "Denv_Guavio_cmd", "Denv_Guayuriba_cmd", "Denv_Humea_cmd", "Denv_Lago_de_tota_cmd", "Denv_Lengupa_cmd", "Denv_Manacacias_cmd", "Denv_Melua_cmd", "Denv_Metica_cmd", "Denv_Negro_cmd", "Denv_Pauto_cmd", "Denv_Tua_cmd", "Denv_Upia_cmd", "Denv_Yucao_cmd","Dfwr_Casanare_cmd", "Dfwr_CravoSur_cmd", "Dfwr_Cumaral_cmd", "Dfwr_Cusiana_cmd", "Dfwr_Dir_btw_ca_or_cmd", "Dfwr_Dir_btw_cu_ca_cmd", "Dfwr_Dir_btw_cu_cs_cmd", "Dfwr_Dir_btw_gb_yu_cmd", "Dfwr_Dir_btw_hu_up_cmd", "Dfwr_Dir_btw_p_ca_cmd", "Dfwr_Garagoa_cmd", "Dfwr_Guacavia_cmd", "Dfwr_Guanapalo_cmd", "Dfwr_Guatiquia_cmd", "Dfwr_Guavio_cmd", "Dfwr_Guayuriba_cmd", "Dfwr_Humea_cmd", "Dfwr_Lago_de_tota_cmd", "Dfwr_Lengupa_cmd", "Dfwr_Manacacias_cmd", "Dfwr_Melua_cmd", "Dfwr_Metica_cmd", "Dfwr_Negro_cmd", "Dfwr_Pauto_cmd", "Dfwr_Tua_cmd", "Dfwr_Upia_cmd", "Dfwr_Yucao_cmd", "Dfwu_Casanare_cmd", "Dfwu_CravoSur_cmd", "Dfwu_Cumaral_cmd", "Dfwu_Cusiana_cmd", "Dfwu_Dir_btw_ca_or_cmd", "Dfwu_Dir_btw_cu_ca_cmd", "Dfwu_Dir_btw_cu_cs_cmd", "Dfwu_Dir_btw_gb_yu_cmd", "Dfwu_Dir_btw_hu_up_cmd", "Dfwu_Dir_btw_p_ca_cmd", "Dfwu_Garagoa_cmd", "Dfwu_Guacavia_cmd", "Dfwu_Guanapalo_cmd", "Dfwu_Guatiquia_cmd", "Dfwu_Guavio_cmd", "Dfwu_Guayuriba_cmd", "Dfwu_Humea_cmd", "Dfwu_Lago_de_tota_cmd", "Dfwu_Lengupa_cmd", "Dfwu_Manacacias_cmd", "Dfwu_Melua_cmd", "Dfwu_Metica_cmd", "Dfwu_Negro_cmd", "Dfwu_Pauto_cmd", "Dfwu_Tua_cmd", "Dfwu_Upia_cmd", "Dfwu_Yucao_cmd", "Dirr_Casanare_cmd", "Dirr_CravoSur_cmd", "Dirr_Cumaral_cmd", "Dirr_Cusiana_cmd", "Dirr_Dir_btw_ca_or_cmd", "Dirr_Dir_btw_cu_ca_cmd", "Dirr_Dir_btw_cu_cs_cmd", "Dirr_Dir_btw_gb_yu_cmd", "Dirr_Dir_btw_hu_up_cmd", "Dirr_Dir_btw_p_ca_cmd", "Dirr_Garagoa_cmd", "Dirr_Guacavia_cmd", "Dirr_Guanapalo_cmd", "Dirr_Guatiquia_cmd", "Dirr_Guavio_cmd", "Dirr_Guayuriba_cmd", "Dirr_Humea_cmd", "Dirr_Lago_de_tota_cmd", "Dirr_Lengupa_cmd", "Dirr_Manacacias_cmd", "Dirr_Melua_cmd", "Dirr_Metica_cmd", "Dirr_Negro_cmd", "Dirr_Pauto_cmd", "Dirr_Tua_cmd", "Dirr_Upia_cmd", "Dirr_Yucao_cmd", "Dliv_Casanare_cmd", "Dliv_CravoSur_cmd", "Dliv_Cumaral_cmd", "Dliv_Cusiana_cmd", "Dliv_Dir_btw_ca_or_cmd", "Dliv_Dir_btw_cu_ca_cmd", "Dliv_Dir_btw_cu_cs_cmd", "Dliv_Dir_btw_gb_yu_cmd", "Dliv_Dir_btw_hu_up_cmd", "Dliv_Dir_btw_p_ca_cmd", "Dliv_Garagoa_cmd", "Dliv_Guacavia_cmd", "Dliv_Guanapalo_cmd", "Dliv_Guatiquia_cmd", "Dliv_Guavio_cmd", "Dliv_Guayuriba_cmd", "Dliv_Humea_cmd", "Dliv_Lago_de_tota_cmd", "Dliv_Lengupa_cmd", "Dliv_Manacacias_cmd", "Dliv_Melua_cmd", "Dliv_Metica_cmd", "Dliv_Negro_cmd", "Dliv_Pauto_cmd", "Dliv_Tua_cmd", "Dliv_Upia_cmd", "Dliv_Yucao_cmd"]
+DEMAND_COMPONENTS = {
+    'Ambiental': [c for c in DEMANDA_AGUA_COLS if c.startswith('Denv_')],
+    'Rural': [c for c in DEMANDA_AGUA_COLS if c.startswith('Dfwr_')],
+    'Urbano': [c for c in DEMANDA_AGUA_COLS if c.startswith('Dfwu_')],
+    'Irrigación': [c for c in DEMANDA_AGUA_COLS if c.startswith('Dirr_')],
+    'Pecuario': [c for c in DEMANDA_AGUA_COLS if c.startswith('Dliv_')]
+}
+
+
+# Esquema de ingesta: solo se leen las columnas que usan los gráficos, en precisión simple.
+SCENARIO_COLUMNS = OFERTA_AGUA_COLS + DEMANDA_AGUA_COLS
+VALUE_DTYPE = 'float32'
+
+# Subcuencas en el orden de OFERTA_AGUA_COLS (p. ej. 'Garagoa' para 'To_downstream_from_Garagoa_cmd').
+SUPPLY_PREFIX = 'To_downstream_from_'
+SUBBASINS = [c[len(SUPPLY_PREFIX):-len('_cmd')] for c in OFERTA_AGUA_COLS]
+
+# --- Malla de Escenarios (opciones de la barra lateral y del manifiesto) ---
+POLICIES = {"First Come First Served (FCFS)": "FCFS", "Policy Enforced (PE)": "PE"}
+RUNS = ["R1", "R2", "R3", "R4", "R5"]
+TEMP_CHANGES = [0, 1, 2, 3, 4, 5]
+PRECIP_CHANGES = [-30, -20, -10, 0, 10, 20, 30]
+PROJECTION_YEARS = [2022, 2030, 2040, 2050]
+# Años que cubre la serie diaria simulada (para el filtro de horizonte).
+HORIZON_YEARS = list(range(PROJECTION_YEARS[0], PROJECTION_YEARS[-1] + 1))
+
+# Ejes en el orden en que aparecen en el nombre de archivo, con la clave usada en los parámetros.
+SCENARIO_AXES = [
+    ('policy', list(POLICIES)),
+    ('run', RUNS),
+    ('tempChange', TEMP_CHANGES),
+    ('precipChange', PRECIP_CHANGES),
+    ('popYear', PROJECTION_YEARS),
+    ('cropYear', PROJECTION_YEARS),
+    ('livestockYear', PROJECTION_YEARS),
+]
+AXIS_LABELS = {
+    'policy': "Política",
+    'run': "Réplica",
+    'tempChange': "Temp. (°C)",
+    'precipChange': "Precip. (%)",
+    'popYear': "Año Pob.",
+    'cropYear': "Año Cult.",
+    'livestockYear': "Año Pec.",
+}
+GRID_SHAPE = tuple(len(values) for _, values in SCENARIO_AXES)
+
+
+def scenario_index(scenario_params):
+    """Devuelve la posición del escenario en la malla. Lanza ``ValueError`` si no pertenece a ella."""
+    return tuple(values.index(scenario_params[name]) for name, values in SCENARIO_AXES)
+
+
+def iter_grid():
+    """Recorre la malla completa devolviendo ``(índice, parámetros)``."""
+    for index in itertools.product(*(range(n) for n in GRID_SHAPE)):
+        yield index, {name: values[i] for (name, values), i in zip(SCENARIO_AXES, index)}
+
+
+def scenario_file_name(scenario_params):
+    """Construye el nombre de archivo del manifiesto a partir de los parámetros del escenario."""
+    policy_code = POLICIES[scenario_params['policy']]
+    return f"OWF_{policy_code}_{scenario_params['run']}_DT{scenario_params['tempChange']}_DP{100 + scenario_params['precipChange']}_FW{scenario_params['popYear']}_Irr{scenario_params['cropYear']}_Liv{scenario_params['livestockYear']}.csv"
@@ -0,0 +1,378 @@
+"""Almacén local y persistente de escenarios en bloques de columna deduplicados.
+
+Cada columna de un escenario (y su eje de fechas) se guarda como un bloque
+``.npy`` unidimensional cuyo nombre es la suma SHA-256 de su contenido
+(``blocks/ab/abcd….npy``). Un bloque idéntico en varios escenarios, como las
+columnas de oferta que comparten los escenarios de un mismo clima y réplica o
+las fechas de la simulación, se guarda una sola vez. Cada escenario es un
+directorio con un ``meta.json``: nombres de columnas, bloque de cada columna,
+bloque de fechas, forma, tipo y el índice por año (``years``: primera y última
+fila, exclusiva, de cada año).
+
+Las lecturas cargan cada bloque en memoria (el archivo se cierra enseguida, de
+modo que un DataFrame vivo no retiene descriptores abiertos) y arman el
+DataFrame como vistas sobre ellos, sin copiar. Los bloques cargados se comparten
+en el proceso mientras algún DataFrame los use: los escenarios que comparten un
+bloque lo tienen una sola vez en memoria. Una lectura con ventana de años
+(``window``) solo lee del disco las filas de esos años de cada bloque. La suma
+de cada bloque se verifica en su primera lectura completa en el proceso, con los
+mismos bytes leídos; las lecturas con ventana no recorren el bloque entero para
+verificarlo.
+
+El tamaño total (bloques únicos) está limitado; se expulsan primero los
+escenarios usados hace más tiempo (LRU por fecha de modificación de
+``meta.json``) y se borran los bloques que ya no usa ningún escenario. La
+escritura y la expulsión se excluyen entre hilos y, con ``flock`` sobre
+``.lock``, entre los procesos que comparten el almacén (p. ej. ``owf.report``).
+"""
+import hashlib
+import io
+import json
+import os
+import re
+import shutil
+import tempfile
+import threading
+import weakref
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+try:
+    import fcntl
+except ImportError:  # Windows: solo se excluyen los hilos del mismo proceso
+    fcntl = None
+
+STORE_DIR = os.environ.get("OWF_STORE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "owf", "escenarios"))
+STORE_MAX_BYTES = int(os.environ.get("OWF_STORE_MAX_BYTES", 2 * 1024 ** 3))
+STORE_FORMAT_VERSION = 3
+
+_BLOCKS_DIR = "blocks"
+_META_FILE = "meta.json"
+_LOCK_FILE = ".lock"
+
+# Bloques cuya suma SHA-256 ya fue verificada en este proceso: {ruta: mtime_ns}
+_verified = {}
+# Bloques cargados en este proceso, compartidos entre escenarios mientras alguno los use: {ruta: arreglo}
+_loaded = weakref.WeakValueDictionary()
+_lock = threading.Lock()
+
+
+def store_key(file_name):
+    """Convierte el nombre de archivo del manifiesto en un nombre de directorio seguro."""
+    stem = os.path.splitext(os.path.basename(file_name))[0]
+    return re.sub(r"[^A-Za-z0-9_.-]", "_", stem)
+
+
+def _entry_path(file_name, store_dir=None):
+    return os.path.join(store_dir or STORE_DIR, store_key(file_name))
+
+
+def _block_path(store_dir, digest):
+    return os.path.join(store_dir, _BLOCKS_DIR, digest[:2], f"{digest}.npy")
+
+
+def _encode_block(array):
+    """Serializa un arreglo 1-D como ``.npy`` y devuelve ``(suma SHA-256, bytes)``."""
+    buffer = io.BytesIO()
+    np.save(buffer, np.ascontiguousarray(array))
+    data = buffer.getvalue()
+    return hashlib.sha256(data).hexdigest(), data
+
+
+def _write_block(store_dir, digest, data):
+    """Guarda un bloque si no existe todavía (escritura atómica)."""
+    path = _block_path(store_dir, digest)
+    if os.path.exists(path):
+        return
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(prefix=".tmp-", dir=os.path.dirname(path))
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except OSError:
+        os.unlink(tmp_path)
+        raise
+    _verified[path] = os.stat(path).st_mtime_ns
+
+
+def _read_block(path, n_rows, rows=None, digest=None):
+    """Lee un bloque ``.npy`` 1-D de ``n_rows`` filas, o solo sus filas ``rows = (inicio, fin)``.
+
+    El arreglo devuelto es dueño de sus datos y el archivo se cierra al terminar.
+    Con ``digest`` (solo en lecturas completas) se verifica la suma SHA-256 del
+    archivo con los mismos bytes leídos.
+    """
+    with open(path, "rb") as f:
+        version = np.lib.format.read_magic(f)
+        read_header = np.lib.format.read_array_header_1_0 if version == (1, 0) else np.lib.format.read_array_header_2_0
+        shape, _, dtype = read_header(f)
+        if shape != (n_rows,) or dtype.hasobject:
+            raise ValueError(f"forma inconsistente en el bloque {path}")
+        offset = f.tell()
+        start, stop = rows if rows is not None else (0, n_rows)
+        f.seek(offset + start * dtype.itemsize)
+        block = np.empty(stop - start, dtype)
+        if f.readinto(block.view(np.uint8)) != block.nbytes:
+            raise ValueError(f"bloque truncado: {path}")
+        if digest is not None:
+            f.seek(0)
+            checksum = hashlib.sha256(f.read(offset))
+            checksum.update(block.view(np.uint8))
+            if f.seek(0, os.SEEK_END) != offset + block.nbytes or checksum.hexdigest() != digest:
+                raise ValueError(f"suma de verificación inválida en el bloque {digest}")
+    return block
+
+
+def _load_block(store_dir, digest, n_rows, rows=None):
+    """Carga un bloque (o sus filas ``rows``) de solo lectura.
+
+    Las lecturas completas verifican la suma la primera vez en el proceso y
+    comparten el bloque con otros escenarios. Las lecturas con ventana solo leen
+    esas filas del disco y no verifican la suma, que se comprueba en la próxima
+    lectura completa.
+    """
+    path = _block_path(store_dir, digest)
+    mtime = os.stat(path).st_mtime_ns
+    verified = _verified.get(path) == mtime
+    block = _loaded.get(path)
+    if block is None or not verified:
+        if rows is not None:
+            block = _read_block(path, n_rows, rows)
+            block.flags.writeable = False
+            return block
+        # El arreglo es dueño de sus datos: las vistas del DataFrame lo mantienen vivo en ``_loaded``.
+        block = _read_block(path, n_rows, digest=None if verified else digest)
+        block.flags.writeable = False
+        _verified[path] = mtime
+        _loaded[path] = block
+    return block if rows is None else block[rows[0]:rows[1]]
+
+
+def _remove_entry(path):
+    shutil.rmtree(path, ignore_errors=True)
+
+
+@contextmanager
+def _store_lock(store_dir):
+    """Excluye a los hilos del proceso y, con ``flock``, a los demás procesos que usan el almacén."""
+    with _lock:
+        if fcntl is None:
+            yield
+            return
+        with open(os.path.join(store_dir, _LOCK_FILE), "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            yield
+
+
+def year_index(dates):
+    """Índice por año de unas fechas ordenadas: ``{año: [fila inicial, fila final)}``."""
+    years = pd.DatetimeIndex(dates).year.to_numpy()
+    unique, starts = np.unique(years, return_index=True)
+    stops = np.append(starts[1:], len(years))
+    return {str(year): [int(start), int(stop)] for year, start, stop in zip(unique, starts, stops)}
+
+
+def window_rows(index, window):
+    """Filas ``[inicio, fin)`` de los años ``window = (primero, último)`` (inclusivo).
+
+    ``index`` es el índice por año de ``year_index`` o unas fechas ordenadas.
+    """
+    first, last = window
+    if isinstance(index, dict):
+        rows = [rows for year, rows in index.items() if first <= int(year) <= last]
+        if not rows:
+            return 0, 0
+        return min(start for start, _ in rows), max(stop for _, stop in rows)
+    dates = pd.DatetimeIndex(index)
+    return (int(dates.searchsorted(pd.Timestamp(first, 1, 1))),
+            int(dates.searchsorted(pd.Timestamp(last + 1, 1, 1))))
+
+
+def slice_window(df, window):
+    """Vista de las filas de ``df`` (índice de fechas ordenado) dentro de la ventana de años."""
+    if window is None:
+        return df
+    start, stop = window_rows(df.index, window)
+    return df.iloc[start:stop]
+
+
+def read_scenario(file_name, store_dir=None, window=None):
+    """Lee un escenario del almacén. Devuelve ``None`` si no existe, está corrupto o no se pudo leer.
+
+    Solo se borran las entradas corruptas; ante otros errores de E/S se conservan.
+    Con ``window = (primer año, último año)`` solo se leen las filas de esos años.
+    """
+    store_dir = store_dir or STORE_DIR
+    path = _entry_path(file_name, store_dir)
+    meta_path = os.path.join(path, _META_FILE)
+    if not os.path.exists(meta_path):
+        return None
+    try:
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("version") != STORE_FORMAT_VERSION:
+            raise ValueError("versión de formato incompatible")
+
+        n_rows = meta["shape"][1]
+        rows = window_rows(meta["years"], window) if window is not None else None
+        dates = _load_block(store_dir, meta["dates"], n_rows, rows)
+        columns = {name: _load_block(store_dir, digest, n_rows, rows)
+                   for name, digest in zip(meta["columns"], meta["blocks"])}
+        if len(columns) != meta["shape"][0]:
+            raise ValueError("forma inconsistente con los metadatos")
+    except (FileNotFoundError, ValueError, KeyError):
+        # Entrada dañada (falta un bloque, la suma o la forma no coinciden, otra versión): se borra.
+        _remove_entry(path)
+        return None
+    except OSError:
+        # Error transitorio (descriptores agotados, permisos, E/S): la entrada se conserva.
+        return None
+
+    # Marca la entrada como usada recientemente para la expulsión LRU.
+    try:
+        os.utime(meta_path)
+    except OSError:
+        pass
+
+    # Un bloque por columna: el DataFrame son vistas sobre los bloques compartidos.
+    return pd.DataFrame(columns, index=pd.DatetimeIndex(np.array(dates), name="Date"), copy=False)
+
+
+def write_scenario(file_name, df, store_dir=None, max_bytes=None):
+    """Guarda un escenario en el almacén de forma atómica. Devuelve ``True`` si se guardó.
+
+    Solo se escriben los bloques de columna que no estaban ya en el almacén.
+    """
+    store_dir = store_dir or STORE_DIR
+    path = _entry_path(file_name, store_dir)
+    numeric = df.select_dtypes("number")
+    dates = df.index.to_numpy(dtype="datetime64[ns]")
+    encoded = [_encode_block(numeric[col].to_numpy()) for col in numeric.columns]
+    dates_digest, dates_data = _encode_block(dates)
+
+    tmp_path = None
+    try:
+        os.makedirs(store_dir, exist_ok=True)
+        tmp_path = tempfile.mkdtemp(prefix=".tmp-", dir=store_dir)
+        meta = {
+            "version": STORE_FORMAT_VERSION,
+            "source": file_name,
+            "columns": [str(c) for c in numeric.columns],
+            "blocks": [digest for digest, _ in encoded],
+            "dates": dates_digest,
+            "shape": [len(numeric.columns), len(dates)],
+            "dtype": str(numeric.dtypes.iloc[0]) if len(numeric.columns) else "float32",
+            "years": year_index(dates),
+        }
+        with open(os.path.join(tmp_path, _META_FILE), "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+
+        # Los bloques y la entrada se publican bajo el candado (también entre procesos)
+        # para que ``evict`` no borre un bloque recién escrito que todavía no
+        # referencia ninguna entrada.
+        with _store_lock(store_dir):
+            for digest, data in [*encoded, (dates_digest, dates_data)]:
+                _write_block(store_dir, digest, data)
+            if os.path.exists(path):
+                _remove_entry(path)
+            os.replace(tmp_path, path)
+    except OSError:
+        if tmp_path:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+        return False
+
+    evict(max_bytes if max_bytes is not None else STORE_MAX_BYTES, store_dir, keep=path)
+    return True
+
+
+def _scan(store_dir):
+    """Entradas ``(mtime, ruta, bloques)`` y tamaño de cada bloque del almacén."""
+    entries = []
+    for name in os.listdir(store_dir):
+        path = os.path.join(store_dir, name)
+        meta_path = os.path.join(path, _META_FILE)
+        if name == _BLOCKS_DIR or name.startswith(".tmp-") or not os.path.exists(meta_path):
+            continue
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            blocks = set(meta["blocks"]) | {meta["dates"]} if meta.get("version") == STORE_FORMAT_VERSION else set()
+        except (OSError, ValueError, KeyError):
+            blocks = set()
+        entries.append((os.path.getmtime(meta_path), path, blocks))
+
+    block_sizes = {}
+    blocks_dir = os.path.join(store_dir, _BLOCKS_DIR)
+    if os.path.isdir(blocks_dir):
+        for prefix in os.listdir(blocks_dir):
+            for name in os.listdir(os.path.join(blocks_dir, prefix)):
+                if name.endswith(".npy") and not name.startswith(".tmp-"):
+                    block_sizes[name[:-len(".npy")]] = os.path.getsize(os.path.join(blocks_dir, prefix, name))
+    return entries, block_sizes
+
+
+def _remove_block(store_dir, digest):
+    path = _block_path(store_dir, digest)
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+    _verified.pop(path, None)
+    _loaded.pop(path, None)
+
+
+def evict(max_bytes=None, store_dir=None, keep=None):
+    """Elimina los escenarios menos usados hasta que los bloques únicos quepan en ``max_bytes``.
+
+    Los bloques que dejan de estar referenciados (también los huérfanos de
+    versiones anteriores o de escrituras interrumpidas) se borran.
+    """
+    store_dir = store_dir or STORE_DIR
+    max_bytes = STORE_MAX_BYTES if max_bytes is None else max_bytes
+    if not os.path.isdir(store_dir):
+        return []
+
+    with _store_lock(store_dir):
+        entries, block_sizes = _scan(store_dir)
+        refs = {}
+        for _, _, blocks in entries:
+            for digest in blocks:
+                refs[digest] = refs.get(digest, 0) + 1
+        for digest in set(block_sizes) - set(refs):
+            _remove_block(store_dir, digest)
+            del block_sizes[digest]
+
+        total = sum(block_sizes.values())
+        removed = []
+        for _, path, blocks in sorted(entries):
+            if total <= max_bytes:
+                break
+            if path == keep:
+                continue
+            _remove_entry(path)
+            removed.append(path)
+            for digest in blocks:
+                refs[digest] -= 1
+                if refs[digest] == 0 and digest in block_sizes:
+                    _remove_block(store_dir, digest)
+                    total -= block_sizes.pop(digest)
+    return removed
+
+
+def store_stats(store_dir=None):
+    """Ocupación del almacén: escenarios, bloques únicos y bytes lógicos frente a físicos."""
+    store_dir = store_dir or STORE_DIR
+    if not os.path.isdir(store_dir):
+        return {'entries': 0, 'blocks': 0, 'logical_bytes': 0, 'physical_bytes': 0}
+    with _store_lock(store_dir):
+        entries, block_sizes = _scan(store_dir)
+    logical = sum(block_sizes.get(digest, 0) for _, _, blocks in entries for digest in blocks)
+    return {
+        'entries': len(entries),
+        'blocks': len(block_sizes),
+        'logical_bytes': logical,
+        'physical_bytes': sum(block_sizes.values()),
+    }
@@ -0,0 +1,133 @@
+"""Barrido de parámetros: cómo responde una métrica al variar uno o dos ejes de la malla.
+
+Los escenarios del barrido se resuelven con el índice del manifiesto y se
+procesan en un flujo con un grupo de hilos: cada trabajador descarga (o lee
+del almacén local) un escenario, lo reduce a unas pocas métricas y descarta el
+DataFrame. Los resultados se entregan a medida que llegan, lo que permite
+mostrar el progreso y resultados parciales.
+
+Las métricas de cada punto se memorizan en ``RESULT_CACHE`` bajo
+``('sweep', archivo)``, de modo que repetir un barrido o cambiar de métrica no
+vuelve a descargar nada. Si el cubo contiene el punto, las medias anuales se
+responden con él sin descargar el escenario.
+"""
+import functools
+import itertools
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import numpy as np
+import pandas as pd
+
+from owf import perf
+from owf.aggregate import aggregate_scenario
+from owf.cache import RESULT_CACHE
+from owf.fetch import FETCH_MAX_WORKERS, fetch_scenario
+from owf.schema import AXIS_LABELS, SCENARIO_AXES, scenario_file_name
+
+SweepPoint = namedtuple("SweepPoint", ["coords", "params", "file_name", "file_id"])
+SweepResult = namedtuple("SweepResult", ["coords", "metrics", "error"])
+
+
+def _mean_annual_deficit(aggregates):
+    deficit = np.maximum(aggregates.daily_demand - aggregates.daily_supply, 0)
+    return float(deficit.groupby(deficit.index.year).sum().mean())
+
+
+def _deficit_days(aggregates):
+    return float((aggregates.daily_demand > aggregates.daily_supply).mean() * 100)
+
+
+METRICS = {
+    "Déficit anual medio (cmd)": _mean_annual_deficit,
+    "Días con déficit (%)": _deficit_days,
+    "Oferta anual media (cmd)": lambda aggregates: float(aggregates.annual_supply.mean()),
+    "Demanda anual media (cmd)": lambda aggregates: float(aggregates.annual_demand.mean()),
+}
+
+# Métricas que el cubo de agregados responde sin descargar el escenario.
+CUBE_METRICS = {
+    "Oferta anual media (cmd)": lambda cube, params: float(cube.annual_totals(params, 'supply').mean()),
+    "Demanda anual media (cmd)": lambda cube, params: float(cube.annual_totals(params, 'demand').mean()),
+}
+
+
+def sweep_points(manifest_index, base_params, axes):
+    """Combinaciones disponibles al variar ``axes`` (1 o 2 nombres de eje) desde ``base_params``."""
+    axis_values = dict(SCENARIO_AXES)
+    points = []
+    for coords in itertools.product(*(axis_values[axis] for axis in axes)):
+        params = dict(base_params, **dict(zip(axes, coords)))
+        file_id = manifest_index.lookup(params)
+        if file_id:
+            points.append(SweepPoint(coords, params, scenario_file_name(params), file_id))
+    return points
+
+
+def reduce_scenario(df):
+    """Reduce un escenario a las métricas de ``METRICS``."""
+    with perf.span("aggregate"):
+        aggregates = aggregate_scenario(df)
+    with perf.span("sweep.metrics"):
+        return {name: metric(aggregates) for name, metric in METRICS.items()}
+
+
+def cached_result(point):
+    """Resultado memorizado de un punto (todas las métricas), o ``None``."""
+    metrics = RESULT_CACHE.get(('sweep', point.file_name))
+    return None if metrics is None else SweepResult(point.coords, metrics, None)
+
+
+def _evaluate(point, cube=None, metric=None):
+    result = cached_result(point)
+    perf.count("cache.sweep.hit" if result is not None else "cache.sweep.miss")
+    if result is not None:
+        return result
+    if cube is not None and metric in CUBE_METRICS and cube.contains(point.params):
+        # Solo la métrica pedida; no se memoriza porque no incluye las demás.
+        return SweepResult(point.coords, {metric: CUBE_METRICS[metric](cube, point.params)}, None)
+    # El escenario se lee del almacén local si ya está, pero no se guarda en él ni
+    # en la caché en memoria, para que un barrido grande no desplace los escenarios
+    # de las comparaciones.
+    result = fetch_scenario(point.file_name, point.file_id, use_cache=False, write_store=False)
+    if result.error is not None:
+        return SweepResult(point.coords, None, result.error)
+    metrics = RESULT_CACHE.put(('sweep', point.file_name), reduce_scenario(result.data))
+    return SweepResult(point.coords, metrics, None)
+
+
+def run_sweep(points, max_workers=None, cube=None, metric=None):
+    """Evalúa los puntos en paralelo y entrega cada ``SweepResult`` en cuanto termina.
+
+    Como máximo hay ``2 * max_workers`` escenarios en curso, de modo que la memoria
+    no crece con el tamaño del barrido. Con ``cube`` y una ``metric`` que el cubo
+    responde, los puntos del cubo no se descargan.
+    """
+    workers = max(1, max_workers or FETCH_MAX_WORKERS)
+    pending = iter(points)
+    evaluate = functools.partial(_evaluate, cube=cube, metric=metric)
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="owf-sweep") as pool:
+        in_flight = {pool.submit(perf.bind(evaluate), point) for point in itertools.islice(pending, 2 * workers)}
+        while in_flight:
+            done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+                in_flight.update(pool.submit(perf.bind(evaluate), point) for point in itertools.islice(pending, 1))
+
+
+def has_metric(results, metric):
+    """Indica si los resultados de un barrido permiten tabular ``metric`` sin volver a evaluarlos."""
+    return all(result.metrics is None or metric in result.metrics for result in results)
+
+
+def sweep_table(results, axes, metric):
+    """Tabla de la métrica: una serie (1 eje) o una matriz (2 ejes) con los valores de los ejes."""
+    axis_values = dict(SCENARIO_AXES)
+    rows = [(*result.coords, result.metrics[metric]) for result in results
+            if result.metrics is not None and metric in result.metrics]
+    data = pd.DataFrame(rows, columns=[*axes, metric])
+    if len(axes) == 1:
+        return data.set_index(axes[0])[metric].reindex(axis_values[axes[0]]).rename_axis(AXIS_LABELS[axes[0]])
+    table = data.pivot_table(index=axes[0], columns=axes[1], values=metric)
+    table = table.reindex(index=axis_values[axes[0]], columns=axis_values[axes[1]])
+    return table.rename_axis(index=AXIS_LABELS[axes[0]], columns=AXIS_LABELS[axes[1]])